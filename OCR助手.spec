@@ -5,7 +5,7 @@ a = Analysis(
     ['F:\\py\\ydcb-auto-master\\gui.py'],
     pathex=[],
     binaries=[],
-    datas=[('logs', 'logs')],
+    datas=[('logs', 'logs'), ('tasks.json', '.')],
     hiddenimports=['PIL._tkinter', 'win32gui', 'win32con', 'win32api', 'paddle', 'paddleocr'],
     hookspath=[],
     hooksconfig={},
@@ -24,7 +24,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -37,7 +37,7 @@ coll = COLLECT(
     a.binaries,
     a.datas,
     strip=False,
-    upx=True,
+    upx=False,
     upx_exclude=[],
     name='OCR助手',
 )
@@ -0,0 +1,124 @@
+import collections
+import logging
+import time
+
+try:
+    import win32api
+    import win32con
+    import win32gui
+except ImportError:  # 非Windows环境下只能使用记录点击的后端
+    win32api = None
+    win32con = None
+    win32gui = None
+
+# 默认点击时序（秒）
+DEFAULT_TIMING = {
+    "activate_delay": 0.1,  # 激活窗口后等待
+    "move_delay": 0.05,     # 移动鼠标后等待
+    "press_delay": 0.05,    # 按下与抬起之间的间隔
+}
+
+
+class InputBackend:
+    """输入后端接口：click() 接收相对于截图的窗口坐标"""
+
+    def __init__(self, timing=None):
+        self.timing = dict(DEFAULT_TIMING)
+        self.timing.update(timing or {})
+        self.logger = logging.getLogger()
+        self.clicks = 0
+
+    def click(self, x, y, timing=None):
+        raise NotImplementedError
+
+    def _timing(self, timing):
+        if not timing:
+            return self.timing
+        merged = dict(self.timing)
+        merged.update(timing)
+        return merged
+
+
+class WindowGeometry:
+    """缓存窗口句柄和客户区原点，只在窗口移动、改变大小或句柄失效时重新计算"""
+
+    def __init__(self, window_title):
+        self.window_title = window_title
+        self.hwnd = 0
+        self.rect = None
+        self.origin = None
+        self.refreshes = 0
+
+    def get_origin(self):
+        """返回 (句柄, 客户区原点)；每次只调用一次 GetWindowRect 检查窗口是否变化"""
+        if not self.hwnd or not win32gui.IsWindow(self.hwnd):
+            self.hwnd = win32gui.FindWindow(None, self.window_title)
+            self.rect = None
+            if self.hwnd == 0:
+                raise ValueError(f"未找到窗口: {self.window_title}")
+
+        rect = win32gui.GetWindowRect(self.hwnd)
+        if rect != self.rect:
+            client_rect = win32gui.GetClientRect(self.hwnd)
+            # 计算窗口边框和标题栏的偏移
+            border_width = ((rect[2] - rect[0]) - client_rect[2]) // 2
+            title_height = (rect[3] - rect[1]) - client_rect[3] - border_width
+            self.rect = rect
+            self.origin = (rect[0] + border_width, rect[1] + title_height)
+            self.refreshes += 1
+            logging.getLogger().info(f"窗口位置: {rect}, 客户区域: {client_rect}, "
+                                     f"边框宽度: {border_width}, 标题栏高度: {title_height}")
+        return self.hwnd, self.origin
+
+
+class Win32InputBackend(InputBackend):
+    """通过 Win32 API 发送真实的鼠标点击"""
+
+    def __init__(self, window_title, timing=None):
+        super().__init__(timing)
+        if win32gui is None:
+            raise RuntimeError("鼠标点击只支持Windows")
+        self.geometry = WindowGeometry(window_title)
+
+    def click(self, x, y, timing=None):
+        timing = self._timing(timing)
+        hwnd, (origin_x, origin_y) = self.geometry.get_origin()
+        click_x = origin_x + int(x)
+        click_y = origin_y + int(y)
+
+        # 窗口已在前台时不必再激活，连续点击可以紧接着执行
+        if win32gui.GetForegroundWindow() != hwnd:
+            win32gui.SetForegroundWindow(hwnd)
+            time.sleep(timing["activate_delay"])
+
+        win32api.SetCursorPos((click_x, click_y))
+        time.sleep(timing["move_delay"])
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, click_x, click_y, 0, 0)
+        time.sleep(timing["press_delay"])
+        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, click_x, click_y, 0, 0)
+        self.clicks += 1
+        self.logger.info(f"已点击位置: ({click_x}, {click_y})，原始坐标: ({x:.0f}, {y:.0f})")
+        return True
+
+
+class RecordingInputBackend(InputBackend):
+    """只记录点击不操作鼠标，用于回放、离线测试和性能测试"""
+
+    def __init__(self, timing=None):
+        super().__init__(timing)
+        self.history = collections.deque(maxlen=10000)  # 最近的点击 [(时间戳, x, y)]，长时间运行不会无限增长
+
+    def click(self, x, y, timing=None):
+        self.history.append((time.time(), float(x), float(y)))
+        self.clicks += 1
+        self.logger.info(f"[模拟] 记录点击位置: ({x:.0f}, {y:.0f})")
+        return True
+
+
+def create_input_backend(window_title, config=None, dry_run=False):
+    """根据配置创建输入后端，dry_run 时只记录点击"""
+    config = config or {}
+    timing = config.get("timing")
+    if dry_run or config.get("backend") == "record":
+        return RecordingInputBackend(timing)
+    return Win32InputBackend(window_title, timing)
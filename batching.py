@@ -0,0 +1,186 @@
+import copy
+import logging
+import time
+
+import numpy as np
+
+from metrics import NullMetrics
+
+
+def group_by_size(shapes, max_pad_ratio=0.25):
+    """按尺寸把图像分组，组内补齐到最大尺寸，补齐浪费的面积比例不超过 max_pad_ratio"""
+    order = sorted(range(len(shapes)), key=lambda i: shapes[i][0] * shapes[i][1], reverse=True)
+    groups = []
+    for i in order:
+        h, w = shapes[i]
+        for group in groups:
+            gh, gw = group["shape"]
+            if h <= gh and w <= gw and 1 - (h * w) / float(gh * gw) <= max_pad_ratio:
+                group["items"].append(i)
+                break
+        else:
+            groups.append({"shape": (h, w), "items": [i]})
+    return groups
+
+
+class BatchStats:
+    """批量推理的耗时统计"""
+
+    def __init__(self):
+        self.batches = 0
+        self.images = 0
+        self.crops = 0
+        self.det_seconds = 0.0
+        self.rec_seconds = 0.0
+        self.last = {}
+
+    def add(self, images, crops, det_seconds, rec_seconds):
+        self.batches += 1
+        self.images += images
+        self.crops += crops
+        self.det_seconds += det_seconds
+        self.rec_seconds += rec_seconds
+        self.last = {
+            "images": images,
+            "crops": crops,
+            "det_ms": round(det_seconds * 1000, 1),
+            "rec_ms": round(rec_seconds * 1000, 1),
+        }
+
+    def summary(self):
+        return {
+            "batches": self.batches,
+            "avg_batch_images": round(self.images / self.batches, 2) if self.batches else 0,
+            "images_per_sec": round(self.images / self.det_seconds, 1) if self.det_seconds else 0,
+            "crops_per_sec": round(self.crops / self.rec_seconds, 1) if self.rec_seconds else 0,
+            "last": self.last,
+        }
+
+
+class BatchRunner:
+    """把多个会话的请求合并成一次检测批次和一次识别批次
+
+    直接调用 PaddleOCR 内部的检测器和识别器：检测时把预处理后尺寸相近的图像补齐后一起推理，
+    再把每张图的概率图裁回原尺寸做后处理；识别时把所有请求的文本框小图交给识别器，
+    识别器内部按宽高比排序并补齐后分批推理。返回结构与 ocr.ocr 相同。
+    """
+
+    def __init__(self, engine, max_pad_ratio=0.25, rec_batch_num=None, metrics=None):
+        # PaddleOCR 把 tools/ppocr 加入了 sys.path，必须在创建引擎之后导入
+        from ppocr.data import transform
+        from tools.infer.predict_system import sorted_boxes
+        from tools.infer.utility import get_minarea_rect_crop, get_rotate_crop_image
+
+        self._transform = transform
+        self._sorted_boxes = sorted_boxes
+        self._crop_quad = get_rotate_crop_image
+        self._crop_rect = get_minarea_rect_crop
+        self.engine = engine
+        self.max_pad_ratio = max_pad_ratio
+        self.stats = BatchStats()
+        self.metrics = metrics or NullMetrics()
+        self.logger = logging.getLogger()
+        if rec_batch_num:
+            engine.text_recognizer.rec_batch_num = rec_batch_num
+
+    def detect(self, images, limits=None):
+        """批量检测，返回每张图的文本框列表；limits 为每张图的检测输入尺寸上限"""
+        detector = self.engine.text_detector
+        resize_op = next((op for op in detector.preprocess_op if hasattr(op, "limit_side_len")), None)
+        default_limit = resize_op.limit_side_len if resize_op else None
+        inputs = []
+        for n, img in enumerate(images):
+            if resize_op:
+                resize_op.limit_side_len = (limits[n] if limits else None) or default_limit
+            data = self._transform({'image': img}, detector.preprocess_op)
+            inputs.append(data if data is not None else (None, None))
+        if resize_op:
+            resize_op.limit_side_len = default_limit
+
+        boxes = [np.zeros((0, 4, 2), dtype=np.float32) for _ in images]
+        valid = [i for i, (tensor, _) in enumerate(inputs) if tensor is not None]
+        shapes = [inputs[i][0].shape[1:] for i in valid]
+        for group in group_by_size(shapes, self.max_pad_ratio):
+            members = [valid[k] for k in group["items"]]
+            gh, gw = group["shape"]
+            batch = np.zeros((len(members), 3, gh, gw), dtype=np.float32)
+            for n, i in enumerate(members):
+                tensor = inputs[i][0]
+                batch[n, :, :tensor.shape[1], :tensor.shape[2]] = tensor
+
+            detector.input_tensor.copy_from_cpu(batch)
+            detector.predictor.run()
+            maps = detector.output_tensors[0].copy_to_cpu()
+
+            for n, i in enumerate(members):
+                tensor, shape_list = inputs[i]
+                # 裁掉补齐部分，后处理按概率图尺寸换算坐标
+                pred = maps[n:n + 1, :, :tensor.shape[1], :tensor.shape[2]]
+                post = detector.postprocess_op({'maps': pred}, np.expand_dims(shape_list, axis=0))
+                boxes[i] = detector.filter_tag_det_res(post[0]['points'], images[i].shape)
+        return boxes
+
+    def _crop(self, img, box):
+        if getattr(self.engine.args, "det_box_type", "quad") == "quad":
+            return self._crop_quad(img, copy.deepcopy(box))
+        return self._crop_rect(img, copy.deepcopy(box))
+
+    def run(self, jobs):
+        """jobs: [(img, kwargs), ...]，返回与之对应的 ocr.ocr 结果列表"""
+        engine = self.engine
+        det_jobs = [i for i, (_, kwargs) in enumerate(jobs) if kwargs.get('det', True)]
+
+        start = time.perf_counter()
+        images = []
+        for i in det_jobs:
+            img = jobs[i][0]
+            if img.ndim == 2:
+                img = np.stack([img] * 3, axis=-1)
+            images.append(np.ascontiguousarray(img))
+        limits = [jobs[i][1].get('det_limit_side_len') for i in det_jobs]
+        det_boxes = self.detect(images, limits) if images else []
+        det_seconds = time.perf_counter() - start
+        if images:
+            self.metrics.observe("det", det_seconds)
+
+        # 收集所有请求的文本框小图，记录每段属于哪个请求
+        crops, segments, use_cls = [], [], []
+        for n, i in enumerate(det_jobs):
+            boxes = self._sorted_boxes(det_boxes[n]) if len(det_boxes[n]) else []
+            det_boxes[n] = boxes
+            segment = [self._crop(images[n], box) for box in boxes]
+            segments.append((i, len(crops), len(segment)))
+            crops.extend(segment)
+            use_cls.extend([jobs[i][1].get('cls', True)] * len(segment))
+        rec_groups = {}
+        for i, (img, kwargs) in enumerate(jobs):
+            if kwargs.get('det', True):
+                continue
+            groups = []
+            for item in (img if isinstance(img, list) else [img]):
+                group = item if isinstance(item, list) else [item]
+                groups.append((len(crops), len(group)))
+                crops.extend(group)
+                use_cls.extend([kwargs.get('cls', True)] * len(group))
+            rec_groups[i] = groups
+
+        start = time.perf_counter()
+        if engine.use_angle_cls and any(use_cls):
+            cls_index = [k for k, flag in enumerate(use_cls) if flag]
+            rotated, _, _ = engine.text_classifier([crops[k] for k in cls_index])
+            for k, crop in zip(cls_index, rotated):
+                crops[k] = crop
+        rec_res = engine.text_recognizer(crops)[0] if crops else []
+        rec_seconds = time.perf_counter() - start
+        self.stats.add(len(images), len(crops), det_seconds, rec_seconds)
+
+        results = [None] * len(jobs)
+        for n, (i, offset, count) in enumerate(segments):
+            lines = []
+            for box, (text, score) in zip(det_boxes[n], rec_res[offset:offset + count]):
+                if score >= engine.drop_score:
+                    lines.append([box.tolist(), (text, score)])
+            results[i] = [lines or None]
+        for i, groups in rec_groups.items():
+            results[i] = [list(rec_res[offset:offset + count]) for offset, count in groups]
+        return results
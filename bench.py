@@ -0,0 +1,262 @@
+import argparse
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from config import load_config
+from engines import create_engine, merge_profiles, run_engine
+from preprocess import Preprocessor
+from rules import box_centers, load_task_flow
+
+# 标注文件名，放在截图目录下
+LABELS_FILE = 'labels.json'
+
+# 未指定配置网格时比较的默认配置
+DEFAULT_GRID = [
+    {"name": "accurate", "profile": "accurate"},
+    {"name": "fast", "profile": "fast"},
+    {"name": "scale_0.75", "preprocess": {"scale": 0.75}},
+    {"name": "min_conf_0.6", "min_confidence": 0.6},
+]
+
+
+def process_rss_mb():
+    """当前进程的常驻内存(MB)，无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1048576
+    except ImportError:
+        pass
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize / 1048576
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except (OSError, ValueError):
+        return None
+
+
+def load_corpus(path):
+    """读取标注的截图集
+
+    labels.json 格式:
+        [{"image": "xxx.png", "state": "任务状态",
+          "targets": [{"rule": "规则名", "box": [x0, y0, x1, y1]}]}]
+    targets 为该截图上应该被点击的规则，box 可省略；没有目标的截图用于统计误点击。
+    """
+    with open(os.path.join(path, LABELS_FILE), 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+    corpus = []
+    for item in labels:
+        image = np.array(Image.open(os.path.join(path, item["image"])).convert("RGB"))
+        corpus.append({"image": image, "name": item["image"], "state": item["state"],
+                       "targets": item.get("targets", [])})
+    return corpus
+
+
+def evaluate(state, result, targets):
+    """按任务处理的匹配逻辑找出会被点击的规则，与标注比较，返回 (命中, 漏掉, 误点击)"""
+    lines = result[0] if result and result[0] else []
+    clicked = {}
+    if lines:
+        centers = box_centers(lines)
+        for rule, hits in zip(state.rules, state.match(lines)):
+            if hits and rule.action == "click":
+                clicked[rule.name] = [centers[i] for i in rule.choose(hits)]
+            # 与任务处理一致：命中带下一个状态的规则后不再处理后面的规则
+            if hits and rule.next:
+                break
+
+    hit = miss = 0
+    for target in targets:
+        points = clicked.pop(target["rule"], None)
+        box = target.get("box")
+        if points is not None and (box is None or any(
+                box[0] <= x <= box[2] and box[1] <= y <= box[3] for x, y in points)):
+            hit += 1
+        else:
+            miss += 1
+    return hit, miss, len(clicked)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_config(config, corpus, tasks_path, repeat=1, profiles=None):
+    """用一组配置跑完整个截图集，返回该配置的报告
+
+    profile 选择引擎配置作为基础，engine、cls、preprocess 中的 det_limit_side_len 再分别覆盖。
+    """
+    logger = logging.getLogger()
+    flow = load_task_flow(tasks_path)
+    if "min_confidence" in config:
+        for state in flow.states.values():
+            for rule in state.rules:
+                rule.min_confidence = config["min_confidence"]
+
+    profile = (profiles or merge_profiles())[config.get("profile", "accurate")]
+    engine_options = dict(profile.get("options", {}), **config.get("engine", {}))
+    rss_before = process_rss_mb()
+    engine = create_engine(**engine_options)
+    preprocessor = Preprocessor(**config.get("preprocess", {}))
+    kwargs = {"cls": config.get("cls", profile.get("cls", True))}
+    if profile.get("det_limit_side_len"):
+        kwargs["det_limit_side_len"] = profile["det_limit_side_len"]
+    kwargs.update(preprocessor.ocr_kwargs())
+    run_engine(engine, preprocessor.apply(corpus[0]["image"]), kwargs)  # 预热，不计入耗时
+
+    latencies = []
+    hits = misses = false_clicks = 0
+    per_state = {}
+    for _ in range(repeat):
+        for item in corpus:
+            start = time.perf_counter()
+            result = preprocessor.restore(run_engine(engine, preprocessor.apply(item["image"]), kwargs))
+            latencies.append((time.perf_counter() - start) * 1000)
+            hit, miss, false_click = evaluate(flow.states[item["state"]], result, item["targets"])
+            hits, misses, false_clicks = hits + hit, misses + miss, false_clicks + false_click
+            stats = per_state.setdefault(item["state"], {"hits": 0, "misses": 0, "false_clicks": 0})
+            stats["hits"] += hit
+            stats["misses"] += miss
+            stats["false_clicks"] += false_click
+            if miss or false_click:
+                logger.info(f"[{config['name']}] {item['name']}: 漏掉 {miss}，误点击 {false_click}")
+
+    rss_after = process_rss_mb()
+    del engine
+    gc.collect()
+    total = hits + misses
+    return {
+        "name": config["name"],
+        "config": config,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "p50": round(percentile(latencies, 0.5), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+        },
+        "rss_mb": round(rss_after, 1) if rss_after is not None else None,
+        "engine_mb": round(rss_after - rss_before, 1) if rss_after is not None else None,
+        "hits": hits,
+        "misses": misses,
+        "false_clicks": false_clicks,
+        "hit_rate": round(hits / total, 4) if total else 1.0,
+        "per_state": per_state,
+    }
+
+
+def run_config_isolated(config, corpus_path, tasks_path, repeat=1, profiles=None):
+    """在新的子进程中运行 run_config
+
+    Paddle 释放引擎后不会把内存还给系统，同一进程里依次测试时后面配置的 engine_mb 几乎为0，
+    每组配置在独立的进程中加载引擎，内存数据才能互相比较。
+    """
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, initializer=_init_worker) as pool:
+        return pool.apply(_run_config_worker, (config, corpus_path, tasks_path, repeat, profiles))
+
+
+def _init_worker():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _run_config_worker(config, corpus_path, tasks_path, repeat, profiles):
+    return run_config(config, load_corpus(corpus_path), tasks_path, repeat, profiles)
+
+
+def compare(report, baseline, max_slowdown=0.1, max_hit_drop=0.0):
+    """与基准报告比较，返回回归描述列表（为空表示没有回归）"""
+    previous = {entry["name"]: entry for entry in baseline["configs"]}
+    regressions = []
+    for entry in report["configs"]:
+        old = previous.get(entry["name"])
+        if not old:
+            continue
+        if entry["latency_ms"]["p95"] > old["latency_ms"]["p95"] * (1 + max_slowdown):
+            regressions.append(f"{entry['name']}: p95 {old['latency_ms']['p95']} -> {entry['latency_ms']['p95']} ms")
+        if entry["hit_rate"] < old["hit_rate"] - max_hit_drop:
+            regressions.append(f"{entry['name']}: 命中率 {old['hit_rate']} -> {entry['hit_rate']}")
+        if entry["false_clicks"] > old["false_clicks"]:
+            regressions.append(f"{entry['name']}: 误点击 {old['false_clicks']} -> {entry['false_clicks']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在标注的截图集上比较不同引擎/预处理/阈值配置的速度和准确率")
+    parser.add_argument("corpus", help=f"截图目录，包含 {LABELS_FILE}")
+    parser.add_argument("--grid", help="配置网格JSON文件，省略时使用内置的几组配置")
+    parser.add_argument("--tasks", default="tasks.json")
+    parser.add_argument("--repeat", type=int, default=1, help="每张截图重复识别的次数")
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--baseline", help="基准报告，有性能或准确率回归时返回非零退出码")
+    parser.add_argument("--max-slowdown", type=float, default=0.1, help="允许的 p95 变慢比例")
+    parser.add_argument("--in-process", action="store_true",
+                        help="所有配置在同一进程中依次运行（更快，但第一组之后的 engine_mb 不可信）")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid, 'r', encoding='utf-8') as f:
+            grid = json.load(f)
+    corpus = load_corpus(args.corpus)
+    profiles = merge_profiles(load_config()["ocr_service"].get("profiles"))
+    if args.in_process:
+        configs = [run_config(config, corpus, args.tasks, args.repeat, profiles) for config in grid]
+        # 引擎内存不会归还系统，第一组之后只有累计的进程内存有意义
+        for entry in configs[1:]:
+            entry["engine_mb"] = None
+    else:
+        configs = [run_config_isolated(config, args.corpus, args.tasks, args.repeat, profiles) for config in grid]
+    report = {
+        "corpus": os.path.abspath(args.corpus),
+        "images": len(corpus),
+        "repeat": args.repeat,
+        "timestamp": time.time(),
+        "isolated": not args.in_process,
+        "configs": configs,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for entry in report["configs"]:
+        print(f"{entry['name']:<20} p50 {entry['latency_ms']['p50']:>8.1f} ms  p95 {entry['latency_ms']['p95']:>8.1f} ms  "
+              f"命中率 {entry['hit_rate']:.3f}  误点击 {entry['false_clicks']}  引擎内存 {entry['engine_mb']} MB  "
+              f"{'进程' if report['isolated'] else '累计'}内存 {entry['rss_mb']} MB")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.max_slowdown)
+        for regression in regressions:
+            print(f"回归: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
@@ -15,7 +15,9 @@ params = [
     '--windowed',  # 使用GUI模式
     '--noconfirm',  # 不询问确认
     '--clean',  # 清理临时文件
+    '--noupx',  # 不压缩paddle等大体积DLL，避免每次启动都要解压
     '--add-data=logs;logs',  # 添加logs文件夹
+    '--add-data=tasks.json;.',  # 任务流程配置
     '--hidden-import=PIL._tkinter',  # 添加隐藏导入
     '--hidden-import=win32gui',
     '--hidden-import=win32con',
@@ -0,0 +1,192 @@
+import copy
+import json
+import logging
+import os
+
+# 配置文件路径（与程序同目录）
+CONFIG_FILE = 'config.json'
+
+# 默认配置，config.json 中只需写需要覆盖的键
+DEFAULT_CONFIG = {
+    # 任务流程配置
+    "tasks": {
+        "path": "tasks.json",   # 状态、目标文本、易混淆字、阈值、动作和识别间隔
+    },
+    # 截图后端：window 为真实窗口，file/synthetic 用于在没有游戏窗口的机器上调试和测试性能
+    "capture": {
+        "backend": "window",
+        "color": "RGB",         # 送给OCR的通道顺序 RGB/BGR
+        "buffers": 3,           # 截图环形缓冲区数量，流水线中同时存在的帧不能超过该值
+        "path": "",             # file 后端的图片文件或目录，replay 后端的录制目录
+        "size": [1280, 720],    # synthetic 后端的画面尺寸
+        "realtime": True,       # replay 后端是否按录制时的时间间隔回放，False 为最快速度
+        "loop": False,          # file/replay 后端读完后是否从头循环
+    },
+    # 录制识别过程，用于离线回放和性能回归
+    "record": {
+        "enabled": False,
+        "path": "recordings",   # 录制保存目录，每次开始识别新建一个子目录
+        "chunk_frames": 200,    # 每个数据块最多保存的帧数
+        "compress_level": 1,    # PNG压缩级别，越低越省CPU
+    },
+    # 多个窗口共享的OCR引擎服务
+    "ocr_service": {
+        "workers": 1,           # 引擎工作线程数，每个线程持有一个引擎实例
+        "preload": True,        # 界面显示后在后台预加载引擎
+        "warm_up": True,        # 引擎创建后先做一次预热推理
+        "mode": "thread",       # thread 在本进程中推理；process 在独立进程中推理，引擎崩溃不影响界面
+        "cpu_threads": None,    # 每个引擎的CPU推理线程数，None 使用引擎默认值
+        "engine": "paddle",     # paddle 为 PaddleOCR；stub 为确定性的假引擎，用于测试
+        "profile": "accurate",  # 默认引擎配置，任务状态可用 profile 单独指定
+        "profiles": {},         # 覆盖或新增引擎配置，内置 accurate/fast 见 engines.DEFAULT_PROFILES
+        # process 模式：帧通过共享内存传给工作进程
+        "process": {
+            "slots": 2,             # 每个工作进程的共享内存槽位数，即同时发送的请求数
+            "timeout": 30.0,        # 工作进程超过该秒数没有返回结果时视为卡死并重启
+            "startup_timeout": 600.0,  # 启动工作进程（导入、加载模型、预热）的最长等待时间，None 表示不限
+        },
+        # 多窗口批量推理：把多个窗口的请求合并成一次检测和一次识别
+        "batching": {
+            "batch_size": 1,        # 每批最多合并的请求数，1 表示不合并
+            "max_wait_ms": 10,      # 收集一批请求的最长等待时间
+            "max_pad_ratio": 0.25,  # 检测时尺寸不同的图像补齐合并的最大浪费面积比例
+            "rec_batch_num": None,  # 识别器每次推理的文本框数，None 使用引擎默认值
+        },
+        # 文本框识别结果缓存：同样的按钮每轮像素相同，识别过的小图不再重复识别
+        "rec_cache": {
+            "enabled": True,
+            "capacity": 2048,           # 最多缓存的小图数，满了淘汰最久未使用的
+            "path": "rec_cache.json",   # 缓存保存位置，为空时不保存
+            "min_confidence": 0.8,      # 只缓存置信度不低于该值的结果
+        },
+    },
+    # 自适应识别调度：学习每个状态通常持续多久，在预期时间附近密集识别
+    "scheduler": {
+        "enabled": True,
+        "min_interval": 0.2,    # 识别间隔下限（秒）
+        "max_interval": 5.0,    # 识别间隔上限（秒）
+        "dense_interval": 0.3,  # 预期时间附近的识别间隔
+        "dense_window": 0.25,   # 密集识别窗口占预期耗时的比例
+        "backoff": 1.5,         # 超过预期仍未命中时的退避倍数
+        "alpha": 0.3,           # 耗时统计的指数移动平均系数
+        "path": "schedule_stats.json",  # 学习到的耗时保存位置
+    },
+    # 鼠标输入
+    "input": {
+        "backend": "win32",     # win32 发送真实点击，record 只记录点击
+        "timing": {             # 点击时序（秒），tasks.json 中的规则可以用 timing 单独覆盖
+            "activate_delay": 0.1,  # 激活窗口后等待（窗口已在前台时跳过）
+            "move_delay": 0.05,     # 移动鼠标后等待
+            "press_delay": 0.05,    # 按下与抬起之间的间隔
+        },
+    },
+    # 点击确认：点击后高频比较目标区域的像素，界面一有反应就继续，超时没有变化时重新点击
+    "verify": {
+        "enabled": True,
+        "timeout": 1.5,         # 等待界面变化的最长时间（秒），规则的 delay_after 更长时使用 delay_after
+        "poll_interval": 0.03,  # 截取目标区域的间隔（秒）
+        "threshold": 6.0,       # 区域灰度平均差异超过该值视为界面已变化
+        "retries": 1,           # 没有变化时重新点击的次数
+        "margin": 24,           # 目标文本框向外扩展的像素
+        "settle": 0.1,          # 检测到变化后等待动画结束的时间（秒）
+    },
+    # 截图/识别/点击流水线
+    "pipeline": {
+        "queue_size": 1,        # 等待识别的帧数，满了丢弃最旧的帧
+    },
+    # 画面变化检测：画面没有变化时复用上一次的OCR结果
+    "frame_diff": {
+        "enabled": True,
+        "threshold": 2.0,       # 指纹平均灰度差阈值(0-255)，低于该值视为未变化
+        "size": [64, 36],       # 指纹下采样尺寸 [宽, 高]
+        "regions": [],          # 只比较的区域，相对比例 [x, y, w, h]，为空时比较整帧
+    },
+    # 任务感兴趣区域(ROI)：只识别目标通常出现的区域，未命中时回退整帧识别
+    "roi": {
+        "enabled": True,
+        "path": "roi_regions.json",  # 学习到的区域保存位置
+        "margin": 0.05,         # 学习区域时在目标框四周扩张的比例
+        "full_frame_every": 3,  # ROI连续未命中时每隔几帧回退一次整帧识别，1表示每次都回退
+        "regions": {},          # 手动配置的区域 {任务名: [x0, y0, x1, y1]}，相对比例
+    },
+    # 文本框布局缓存：布局稳定时跳过文本检测，只识别缓存的文本框
+    "layout_cache": {
+        "enabled": True,
+        "layout_threshold": 6.0,  # 任一指纹分块的差异超过该值视为布局变化，重新检测
+        "block": 4,               # 分块大小（指纹格子数），64x36 的指纹分成 16x9 块
+        "min_confidence": 0.5,    # 原本可读的文本框置信度低于该值时重新检测
+        "max_age": 20,            # 同一布局连续复用的最多次数，之后强制重新检测
+    },
+    # 本地控制接口：每行一个JSON命令，界面和无界面运行器(runner.py)都支持
+    "control": {
+        "enabled": False,
+        "host": "127.0.0.1",    # 只监听本机
+        "port": 47800,
+    },
+    # 日志：文件和控制台写入在后台线程中完成
+    "logging": {
+        "queue_size": 10000,        # 日志队列长度，满了丢弃新日志，不阻塞识别
+        "dump_interval": 1.0,       # 逐行输出识别文本（dump_text）的最小间隔（秒）
+        "dump_max_lines": 20,       # 每次最多输出的识别文本行数
+        "events_path": "",          # 结构化事件日志(JSONL)路径，为空时不记录
+        "console_max_lines": 2000,  # 界面控制台保留的最多行数
+        "console_flush_ms": 200,    # 界面控制台批量刷新间隔（毫秒）
+    },
+    # OCR前的预处理，profile_path 中按分辨率校准的参数优先（python preprocess.py 截图目录）
+    "preprocess": {
+        "scale": 1.0,               # 缩放比例，小于1时缩小后再识别
+        "grayscale": False,         # 转为灰度
+        "margins": [0, 0, 0, 0],    # 整帧识别时裁掉的边缘，相对比例 [左, 上, 右, 下]
+        "det_limit_side_len": None, # 检测器输入的最长边，None 使用引擎默认值
+        "profile_path": "preprocess_profiles.json",
+    },
+    # 大窗口分块识别：切成互相重叠的分块，同时交给OCR服务的多个工作线程/进程
+    "tiling": {
+        "enabled": False,
+        "tile_size": 960,       # 分块边长（像素）
+        "overlap": 160,         # 相邻分块的重叠像素，需要大于最长的目标文本宽度
+        "min_side": 1600,       # 长边不小于该值的图像才分块
+        "overlap_threshold": 0.6,  # 两个文本框交集占较小框面积的比例超过该值时视为接缝处的重复
+    },
+    # 已知按钮的模板匹配：OCR找到目标后保存像素块，之后的帧先在原位置附近匹配，匹配不到时才做OCR
+    "templates": {
+        "enabled": True,
+        "threshold": 0.92,      # 归一化互相关得分阈值(-1~1)
+        "search_margin": 32,    # 在模板原位置四周搜索的范围（像素）
+        "verify_every": 10,     # 连续用模板结果多少次后做一次完整OCR校验
+        "max_templates": 8,     # 每个任务状态和窗口尺寸最多保存的模板数
+        "max_intensity_shift": 24.0,  # 匹配位置与模板平均灰度的最大差异，超过时（如按钮变暗）不算匹配
+        "min_contrast": 0.7,    # 匹配位置的灰度标准差至少为模板的多少倍，低于时（如按钮变灰）不算匹配
+    },
+    # 性能统计：各阶段耗时分布和计数，定期写入文件并显示在界面上
+    "metrics": {
+        "enabled": False,
+        "path": "metrics.json",           # JSON 格式统计文件，为空时不写
+        "prometheus_path": "metrics.prom",  # Prometheus 文本格式统计文件，为空时不写
+        "interval": 5.0,                  # 写入文件的间隔（秒）
+        "window": 1024,                   # 计算分位数时保留的最近样本数
+    },
+}
+
+
+def _merge(base, override):
+    """递归合并配置字典"""
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def load_config(path=CONFIG_FILE):
+    """加载配置文件，缺失的键使用默认值"""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if not os.path.exists(path):
+        return config
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            _merge(config, json.load(f))
+    except Exception as e:
+        logging.getLogger().error(f"读取配置文件失败: {str(e)}")
+    return config
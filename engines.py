@@ -0,0 +1,211 @@
+import copy
+import json
+import logging
+import threading
+import time
+
+from metrics import instrument_engine
+from rec_cache import install_cache
+
+# 内置的引擎配置，可在 ocr_service.profiles 中覆盖或新增
+#   cls: 是否做方向分类  det_limit_side_len: 检测器输入的最长边，None 使用引擎默认值
+#   options: 创建引擎的参数（engine 选择引擎类型，其余传给引擎，例如 cpu_threads、enable_mkldnn、
+#            det_model_dir/rec_model_dir、ocr_version）
+DEFAULT_PROFILES = {
+    # 原来的配置：方向分类 + 默认模型
+    "accurate": {"cls": True, "det_limit_side_len": None, "options": {}},
+    # 游戏界面的文字总是正的：不加载方向分类模型，开启MKLDNN，检测输入缩小
+    "fast": {"cls": False, "det_limit_side_len": 736,
+             "options": {"use_angle_cls": False, "enable_mkldnn": True}},
+}
+
+# 影响识别结果的引擎参数，这些参数相同的引擎才共用识别结果缓存
+REC_OPTIONS = ("engine", "lang", "ocr_version", "rec_model_dir", "rec_algorithm", "rec_char_dict_path",
+               "rec_image_shape")
+
+
+def create_paddle_ocr(cpu_threads=None, **overrides):
+    """创建PaddleOCR对象，优化配置；paddle 在这里才导入，界面启动时不必等待
+
+    overrides 覆盖下面的默认参数，由引擎配置和性能测试传入。
+    """
+    logger = logging.getLogger()
+    start = time.perf_counter()
+    from paddleocr import PaddleOCR
+    imported = time.perf_counter()
+    options = dict(
+        use_angle_cls=True,  # 使用方向分类
+        lang="ch",           # 中文模型
+        use_gpu=False,       # 禁用 GPU
+        det_db_thresh=0.3,   # 文本检测阈值
+        det_db_box_thresh=0.5,  # 文本检测框阈值
+        det_db_unclip_ratio=1.6,  # 文本检测框扩张比例
+        rec_char_dict_path=None,  # 使用默认字典
+        show_log=False,      # 关闭日志输出
+    )
+    if cpu_threads:
+        options["cpu_threads"] = cpu_threads  # 每个引擎的CPU推理线程数
+    options.update(overrides)
+    ocr = PaddleOCR(**options)
+    loaded = time.perf_counter()
+    logger.info(f"OCR引擎启动耗时: 导入 {(imported - start) * 1000:.0f} ms, "
+                f"加载模型 {(loaded - imported) * 1000:.0f} ms")
+    return ocr
+
+
+class StubEngine:
+    """确定性的假引擎，接口与 PaddleOCR.ocr 相同，用于测试和没有模型时调试流程
+
+    results 为 ocr.ocr 结构的结果列表（或从 path 指定的JSON文件读取），整帧识别按调用顺序循环返回；
+    只识别模式(det=False)按顺序返回上一次整帧结果中的文本。其余引擎参数忽略，
+    同一个引擎配置可以在真实引擎和假引擎之间切换。
+    """
+
+    def __init__(self, results=None, path=None, latency=0.0, **options):
+        if path:
+            with open(path, 'r', encoding='utf-8') as f:
+                results = json.load(f)
+        self.results = results or [[None]]
+        self.latency = latency  # 每次调用的模拟耗时（秒）
+        self.calls = 0
+        self._last = []
+        self._lock = threading.Lock()
+
+    def ocr(self, img, det=True, rec=True, cls=True, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if not det:
+                texts = [tuple(line[1]) for line in self._last]
+                output = []
+                for item in (img if isinstance(img, list) else [img]):
+                    count = len(item) if isinstance(item, list) else 1
+                    output.append([texts[i] if i < len(texts) else ("", 0.0) for i in range(count)])
+                return output
+            result = copy.deepcopy(self.results[self.calls % len(self.results)])
+            self.calls += 1
+            self._last = result[0] if result and result[0] else []
+            return result
+
+
+def create_engine(engine="paddle", **options):
+    """按类型创建引擎：paddle 为 PaddleOCR，stub 为确定性的假引擎"""
+    if engine == "stub":
+        return StubEngine(**options)
+    if engine == "paddle":
+        return create_paddle_ocr(**options)
+    raise ValueError(f"未知的OCR引擎类型: {engine}")
+
+
+def merge_profiles(custom=None):
+    """内置引擎配置加上配置文件中的覆盖，同名配置的 options 逐项合并"""
+    profiles = copy.deepcopy(DEFAULT_PROFILES)
+    for name, profile in (custom or {}).items():
+        merged = profiles.setdefault(name, {"cls": True, "det_limit_side_len": None, "options": {}})
+        merged["options"] = dict(merged.get("options", {}), **profile.get("options", {}))
+        merged.update({k: v for k, v in profile.items() if k != "options"})
+    return profiles
+
+
+def warm_up(engine, cls=True):
+    """用空白图做一次检测和一次识别，把首次推理的初始化开销提前付掉"""
+    import numpy as np
+    start = time.perf_counter()
+    engine.ocr(np.full((320, 320, 3), 255, dtype=np.uint8), cls=cls)
+    engine.ocr([[np.full((48, 320, 3), 255, dtype=np.uint8)]], det=False, cls=False)
+    return time.perf_counter() - start
+
+
+def detector_resize_op(engine):
+    """检测器预处理中负责缩放的算子，没有时返回None"""
+    detector = getattr(engine, "text_detector", None)
+    for op in getattr(detector, "preprocess_op", None) or []:
+        if hasattr(op, "limit_side_len"):
+            return op
+    return None
+
+
+def run_engine(engine, img, kwargs):
+    """调用 engine.ocr；det_limit_side_len 只对这一次调用临时修改检测器的输入尺寸上限"""
+    limit = kwargs.get("det_limit_side_len")
+    if limit is None:
+        return engine.ocr(img, **kwargs)
+    kwargs = {k: v for k, v in kwargs.items() if k != "det_limit_side_len"}
+    op = detector_resize_op(engine)
+    if op is None:
+        return engine.ocr(img, **kwargs)
+    previous = op.limit_side_len
+    op.limit_side_len = limit
+    try:
+        return engine.ocr(img, **kwargs)
+    finally:
+        op.limit_side_len = previous
+
+
+class EngineSet:
+    """一个工作线程（或工作进程）持有的引擎，按请求中的引擎配置名选择
+
+    options 相同的配置共用一个引擎实例，引擎在第一次使用时才创建；cls、det_limit_side_len
+    作为调用参数的默认值合并到每个请求中，请求中明确给出的参数优先。
+    """
+
+    def __init__(self, factory=create_engine, profiles=None, default="accurate", warm=True,
+                 metrics=None, rec_cache=None):
+        self.factory = factory
+        self.profiles = profiles or merge_profiles()
+        self.default = default if default in self.profiles else "accurate"
+        self.warm = warm
+        self.metrics = metrics      # 开启统计时为各阶段计时
+        self.rec_cache = rec_cache  # 只装在与默认配置识别模型相同的引擎上
+        self.logger = logging.getLogger()
+        self._engines = {}
+        self._unknown = set()
+
+    def _profile(self, name):
+        if name is None:
+            name = self.default
+        elif name not in self.profiles:
+            if name not in self._unknown:
+                self._unknown.add(name)
+                self.logger.warning(f"未知的引擎配置 '{name}'，使用默认配置 '{self.default}'")
+            name = self.default
+        return name, self.profiles[name]
+
+    def _rec_key(self, options):
+        return {key: options.get(key) for key in REC_OPTIONS}
+
+    def engine(self, name=None):
+        """取配置对应的引擎，返回 (引擎, 引擎键)"""
+        name, profile = self._profile(name)
+        options = profile.get("options", {})
+        key = json.dumps(options, sort_keys=True)
+        engine = self._engines.get(key)
+        if engine is None:
+            engine = self.factory(**options)
+            if self.warm:
+                self.logger.info(f"OCR引擎配置 '{name}' 首次推理耗时: "
+                                 f"{warm_up(engine, profile.get('cls', True)) * 1000:.0f} ms")
+            if self.metrics is not None and self.metrics.enabled:
+                instrument_engine(engine, self.metrics)
+            # 缓存放在计时之外，rec 耗时只统计真正送进识别器的小图
+            default_options = self.profiles[self.default].get("options", {})
+            if self.rec_cache is not None and self._rec_key(options) == self._rec_key(default_options):
+                install_cache(engine, self.rec_cache)
+            self._engines[key] = engine
+        return engine, key
+
+    def resolve(self, kwargs):
+        """按请求参数中的 profile 选择引擎，返回 (引擎, 引擎键, 合并后的调用参数)"""
+        kwargs = dict(kwargs)
+        name, profile = self._profile(kwargs.pop("profile", None))
+        engine, key = self.engine(name)
+        call = {"cls": profile.get("cls", True)}
+        if profile.get("det_limit_side_len"):
+            call["det_limit_side_len"] = profile["det_limit_side_len"]
+        # 请求没有指定检测尺寸（None）时保留配置中的值
+        call.update({k: v for k, v in kwargs.items() if not (k == "det_limit_side_len" and v is None)})
+        return engine, key, call
+
+    def run(self, img, kwargs):
+        engine, _, call = self.resolve(kwargs)
+        return run_engine(engine, img, call)
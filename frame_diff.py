@@ -0,0 +1,81 @@
+import numpy as np
+
+
+def compute_fingerprint(img_array, size=(64, 36)):
+    """计算帧的下采样灰度指纹"""
+    width, height = size
+    img_h, img_w = img_array.shape[:2]
+
+    # 先按步长粗采样，再做块平均，避免对整帧做浮点运算
+    step_y = max(1, img_h // (height * 4))
+    step_x = max(1, img_w // (width * 4))
+    small = img_array[::step_y, ::step_x]
+    if small.ndim == 3:
+        small = small[..., :3].mean(axis=2)
+    else:
+        small = small.astype(np.float32)
+
+    crop_h = (small.shape[0] // height) * height
+    crop_w = (small.shape[1] // width) * width
+    if crop_h == 0 or crop_w == 0:
+        return small.astype(np.float32)
+
+    small = small[:crop_h, :crop_w].reshape(
+        height, crop_h // height, width, crop_w // width
+    ).mean(axis=(1, 3))
+    return small.astype(np.float32)
+
+
+class FrameChangeDetector:
+    """比较相邻帧的指纹，判断画面是否发生了有意义的变化"""
+
+    def __init__(self, threshold=2.0, size=(64, 36), regions=None):
+        self.threshold = threshold
+        self.size = tuple(size)
+        self.regions = regions or []  # 相对比例 [x, y, w, h]
+        self.skipped_frames = 0       # 因画面未变化而跳过OCR的帧数
+        self.last_diff = None
+        self._reference = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            threshold=config.get("threshold", 2.0),
+            size=config.get("size", (64, 36)),
+            regions=config.get("regions"),
+        )
+
+    def _region_slices(self, shape):
+        """把相对比例区域换算成指纹上的切片"""
+        fp_h, fp_w = shape
+        slices = []
+        for x, y, w, h in self.regions:
+            x0 = int(x * fp_w)
+            y0 = int(y * fp_h)
+            x1 = max(x0 + 1, int((x + w) * fp_w))
+            y1 = max(y0 + 1, int((y + h) * fp_h))
+            slices.append((slice(y0, y1), slice(x0, x1)))
+        return slices or [(slice(None), slice(None))]
+
+    def diff(self, fingerprint):
+        """返回与参考帧的最大区域差异，无参考帧或尺寸变化时返回None"""
+        if self._reference is None or self._reference.shape != fingerprint.shape:
+            return None
+        delta = np.abs(fingerprint - self._reference)
+        return max(float(delta[s].mean()) for s in self._region_slices(delta.shape))
+
+    def has_changed(self, img_array):
+        """判断画面是否变化；变化时更新参考帧，未变化时累加跳过计数"""
+        fingerprint = compute_fingerprint(img_array, self.size)
+        self.last_diff = self.diff(fingerprint)
+        if self.last_diff is None or self.last_diff > self.threshold:
+            # 只在变化时更新参考帧，避免缓慢渐变被逐帧吸收
+            self._reference = fingerprint
+            return True
+        self.skipped_frames += 1
+        return False
+
+    def reset(self):
+        """清除参考帧，下一帧一定会被识别（例如点击之后）"""
+        self._reference = None
+        self.last_diff = None
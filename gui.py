@@ -1,297 +1,51 @@
-import sys
 import time
+
+# 在导入其他模块之前记录，界面启动耗时包括导入 PyQt 等模块的时间
+APP_START = time.perf_counter()
+
+import sys
+import threading
+import multiprocessing
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                            QHBoxLayout, QComboBox, QPushButton, QTextEdit, 
-                            QLabel, QMessageBox)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+                            QHBoxLayout, QPushButton, QPlainTextEdit, 
+                            QLabel, QMessageBox, QListWidget, QAbstractItemView)
+from PyQt5.QtCore import QTimer, pyqtSignal
 import win32gui
 import win32con
 import win32api
-from screen import capture_application_window
-from paddleocr import PaddleOCR
-from PIL import Image
+from config import load_config
+from logging_setup import setup_logger
+from metrics import format_stats
+from runner import ControlServer, SessionManager
 import logging
-import numpy as np
-from datetime import datetime
-import os
-import subprocess
-
-# 创建日志记录器
-def setup_logger():
-    # 创建logs目录（如果不存在）
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    
-    # 生成日志文件名，包含时间戳
-    log_filename = f'logs/ocr_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
-    
-    # 创建日志记录器
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
-    # 创建文件处理器
-    file_handler = logging.FileHandler(log_filename, mode='a', encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
-    
-    # 创建控制台处理器
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    
-    # 创建格式化器
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    
-    # 添加处理器到日志记录器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
-
-class OCRThread(QThread):
-    update_signal = pyqtSignal(str)
-    finished_signal = pyqtSignal()
-
-    def __init__(self, window_title):
-        super().__init__()
-        self.window_title = window_title
-        self.is_running = True
-        self.logger = logging.getLogger()
-        self.recognition_interval = 2  # 默认识别间隔为2秒
-        self.last_click_time = 0  # 记录上次点击时间
-        
-        # 任务状态
-        self.TASK_START_DUNGEON = "开始秘境"
-        self.TASK_WAIT_WHISTLE = "等待吹响"
-        self.TASK_WHISTLE_FIGHT = "吹响打怪"
-        self.current_task = self.TASK_START_DUNGEON
-
-    def click_at_position(self, x, y):
-        """在指定位置模拟鼠标左键点击"""
-        try:
-            # 获取窗口句柄
-            hwnd = win32gui.FindWindow(None, self.window_title)
-            if hwnd == 0:
-                self.logger.error(f"未找到窗口: {self.window_title}")
-                return False
-                
-            # 获取窗口位置
-            rect = win32gui.GetWindowRect(hwnd)
-            # 获取窗口客户区域位置
-            client_rect = win32gui.GetClientRect(hwnd)
-            
-            # 计算窗口边框和标题栏的偏移
-            border_width = ((rect[2] - rect[0]) - client_rect[2]) // 2
-            title_height = (rect[3] - rect[1]) - client_rect[3] - border_width
-            
-            # 计算相对于窗口客户区域的点击位置
-            click_x = rect[0] + border_width + int(x)
-            click_y = rect[1] + title_height + int(y)
-            
-            self.logger.info(f"窗口位置: {rect}, 客户区域: {client_rect}")
-            self.logger.info(f"边框宽度: {border_width}, 标题栏高度: {title_height}")
-            self.logger.info(f"原始坐标: ({x}, {y}), 计算后坐标: ({click_x}, {click_y})")
-            
-            # 激活窗口
-            win32gui.SetForegroundWindow(hwnd)
-            time.sleep(0.1)  # 等待窗口激活
-            
-            # 移动鼠标并点击
-            win32api.SetCursorPos((click_x, click_y))
-            time.sleep(0.1)  # 等待鼠标移动
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, click_x, click_y, 0, 0)
-            time.sleep(0.1)
-            win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, click_x, click_y, 0, 0)
-            
-            self.last_click_time = time.time()
-            self.logger.info(f"已点击位置: ({click_x}, {click_y})")
-            return True
-        except Exception as e:
-            self.logger.error(f"点击操作失败: {str(e)}")
-            return False
-
-    def handle_start_dungeon_task(self, result):
-        """处理开始秘境任务"""
-        for line in result[0]:
-            text = line[1][0]  # 识别的文本
-            confidence = line[1][1]  # 置信度
-            
-            # 检查是否识别到"自动骰子"
-            if ("自动骰子" in text or "自动般子" in text) and confidence > 0.5:
-                # 计算中心点
-                center_x = np.mean([p[0] for p in line[0]])
-                center_y = np.mean([p[1] for p in line[0]])
-                
-                self.logger.info(f"识别到目标文本: {text} (置信度: {confidence:.2f})")
-                self.update_signal.emit(f"识别到目标文本: {text} (置信度: {confidence:.2f})")
-                
-                # 点击自动骰子
-                if self.click_at_position(center_x, center_y):
-                    self.update_signal.emit("已点击'自动骰子'位置")
-                    # 切换到等待吹响任务
-                    self.current_task = self.TASK_WAIT_WHISTLE
-                    self.recognition_interval = 3  # 设置识别间隔为3秒
-                    self.logger.info("切换到等待吹响任务")
-                    return True
-        return False
-
-    def handle_wait_whistle_task(self, result):
-        """处理等待吹响任务"""
-        found_whistle = False
-        
-        for line in result[0]:
-            text = line[1][0]
-            confidence = line[1][1]
-            
-            # 检查是否识别到"自动投掷骰子中"
-            if ("自动投掷骰子中" in text or "自动投掷般子中" in text) and confidence > 0.5:
-                self.logger.info(f"识别到目标文本: {text} (置信度: {confidence:.2f})")
-                self.update_signal.emit(f"识别到目标文本: {text} (置信度: {confidence:.2f})")
-            
-            # 检查是否识别到"吹响"
-            if "吹响" in text and confidence > 0.5:
-                found_whistle = True
-                self.logger.info(f"识别到目标文本: {text} (置信度: {confidence:.2f})")
-                self.update_signal.emit(f"识别到目标文本: {text} (置信度: {confidence:.2f})")
-                
-                # 计算中心点
-                center_x = np.mean([p[0] for p in line[0]])
-                center_y = np.mean([p[1] for p in line[0]])
-                
-                # 点击吹响
-                if self.click_at_position(center_x, center_y):
-                    self.update_signal.emit(f"已点击'吹响'位置: ({center_x}, {center_y})")
-                    time.sleep(0.5)  # 每次点击后稍微等待一下
-        
-        # 如果识别到任何"吹响"文本，切换到吹响打怪任务
-        if found_whistle:
-            self.current_task = self.TASK_WHISTLE_FIGHT
-            self.recognition_interval = 3  # 设置识别间隔为3秒
-            self.logger.info("切换到吹响打怪任务")
-            return True
-            
-        return False
-
-    def handle_whistle_fight_task(self, result):
-        """处理吹响打怪任务"""
-        percent_box = None
-        confirm_box = None
-        
-        # 查找包含"增加"、"减少"和"确定"文本
-        for line in result[0]:
-            text = line[1][0]
-            confidence = line[1][1]
-            
-            self.logger.info(f"识别到文本: {text} (置信度: {confidence:.2f})")
-            
-            if ("增加" in text or "减少" in text) and confidence > 0.7:
-                percent_box = line[0]
-                self.logger.info(f"找到目标文本: {text}")
-            elif text == "确定" and confidence > 0.7:
-                confirm_box = line[0]
-                self.logger.info(f"找到目标文本: {text}")
-        
-        # 点击包含"增加"或"减少"的文本
-        if percent_box:
-            center_x = np.mean([p[0] for p in percent_box])
-            center_y = np.mean([p[1] for p in percent_box])
-            self.logger.info(f"准备点击'增加/减少'文本位置: ({center_x}, {center_y})")
-            
-            # 尝试点击，最多重试3次
-            if self.click_at_position(center_x, center_y):
-                self.logger.info(f"成功点击'增加/减少'文本位置: ({center_x}, {center_y})")
-                self.update_signal.emit("已点击'增加/减少'文本位置")
-        
-        # 点击"确定"文本
-        if confirm_box:
-            center_x = np.mean([p[0] for p in confirm_box])
-            center_y = np.mean([p[1] for p in confirm_box])
-            self.logger.info(f"准备点击'确定'文本位置: ({center_x}, {center_y})")
-            
-            # 尝试点击，最多重试3次
-
-            if self.click_at_position(center_x, center_y):
-                self.logger.info(f"成功点击'确定'文本位置: ({center_x}, {center_y})")
-                self.update_signal.emit("已点击'确定'文本位置")
-                    
-                # 等待并校验点击是否成功
-                time.sleep(1.5)
-                
-                self.current_task = self.TASK_START_DUNGEON
-                self.recognition_interval = 2
-                self.logger.info("完成本轮任务，重新开始")
-                return True
-        
-        return False
-
-    def run(self):
-        try:
-            # 创建PaddleOCR对象，优化配置
-            self.logger.info("正在初始化OCR引擎...")
-            self.update_signal.emit("正在初始化OCR引擎...")
-            ocr = PaddleOCR(
-                use_angle_cls=True,  # 使用方向分类
-                lang="ch",           # 中文模型
-                use_gpu=False,       # 禁用 GPU
-                det_db_thresh=0.3,   # 文本检测阈值
-                det_db_box_thresh=0.5,  # 文本检测框阈值
-                det_db_unclip_ratio=1.6,  # 文本检测框扩张比例
-                rec_char_dict_path=None,  # 使用默认字典
-                show_log=False       # 关闭日志输出
-            )
-            self.logger.info("OCR引擎初始化完成")
-
-            while self.is_running:
-                try:
-                    # 截图
-                    self.logger.info(f"正在截取窗口 '{self.window_title}' 的截图")
-                    img = capture_application_window(self.window_title)
-                    img_array = np.array(img)
-
-                    # OCR识别
-                    self.logger.info("开始OCR识别")
-                    result = ocr.ocr(img_array, cls=True)
-
-                    if result:
-                        text_count = len(result[0])
-                        self.logger.info(f"识别到 {text_count} 个文本区域")
-                        self.logger.info(f"当前任务状态: {self.current_task}")
-                        
-                        # 根据当前任务状态处理识别结果
-                        if self.current_task == self.TASK_START_DUNGEON:
-                            self.handle_start_dungeon_task(result)
-                        elif self.current_task == self.TASK_WAIT_WHISTLE:
-                            self.handle_wait_whistle_task(result)
-                        elif self.current_task == self.TASK_WHISTLE_FIGHT:
-                            self.handle_whistle_fight_task(result)
-                    else:
-                        self.logger.info("未识别到任何文本")
-
-                    time.sleep(self.recognition_interval)  # 使用动态识别间隔
-
-                except Exception as e:
-                    error_msg = f"识别过程出错: {str(e)}"
-                    self.logger.error(error_msg)
-                    self.update_signal.emit(error_msg)
-                    time.sleep(1)
-
-        except Exception as e:
-            error_msg = f"OCR引擎初始化失败: {str(e)}"
-            self.logger.error(error_msg)
-            self.update_signal.emit(error_msg)
-
-        self.finished_signal.emit()
-
-    def stop(self):
-        self.logger.info("停止OCR识别")
-        self.is_running = False
 
 class MainWindow(QMainWindow):
+    engine_status_signal = pyqtSignal(str)
+    message_signal = pyqtSignal(str, str)   # 窗口标题, 消息
+    session_signal = pyqtSignal(str, bool)  # 窗口标题, 是否正在识别
+
     def __init__(self):
         super().__init__()
-        self.ocr_thread = None
         self.logger = logging.getLogger()
+        self.config = load_config()
+        self.console_pending = []  # 等待批量写入控制台的消息
+        # 识别逻辑都在 SessionManager 中，界面只负责显示和操作；回调来自会话线程，通过信号转到界面线程
+        self.manager = SessionManager(self.config, on_message=self.message_signal.emit,
+                                      on_change=self.session_signal.emit)
+        self.metrics = self.manager.metrics
+        self.ocr_service = self.manager.ocr_service
+        self.message_signal.connect(self.update_console)
+        self.session_signal.connect(self.session_changed)
         self.initUI()
+        self.control_server = None
+        if self.config["control"].get("enabled", False):
+            self.control_server = ControlServer.from_config(self.manager, self.config["control"])
+            self.control_server.start()
+        if self.metrics.enabled:
+            self.metrics.start()
+            self.stats_timer = QTimer(self)
+            self.stats_timer.timeout.connect(self.update_stats)
+            self.stats_timer.start(1000)
 
     def initUI(self):
         self.setWindowTitle('OCR窗口识别工具')
@@ -305,11 +59,13 @@ class MainWindow(QMainWindow):
         # 创建窗口选择部分
         window_layout = QHBoxLayout()
         window_label = QLabel('选择窗口:')
-        self.window_combo = QComboBox()
+        self.window_list = QListWidget()
+        self.window_list.setSelectionMode(QAbstractItemView.ExtendedSelection)  # 可同时选择多个窗口
+        self.window_list.setMaximumHeight(120)
         self.refresh_button = QPushButton('刷新窗口列表')
         self.refresh_button.clicked.connect(self.refresh_windows)
         window_layout.addWidget(window_label)
-        window_layout.addWidget(self.window_combo)
+        window_layout.addWidget(self.window_list)
         window_layout.addWidget(self.refresh_button)
         layout.addLayout(window_layout)
 
@@ -322,19 +78,33 @@ class MainWindow(QMainWindow):
         self.stop_button.setEnabled(False)
         button_layout.addWidget(self.start_button)
         button_layout.addWidget(self.stop_button)
+        self.engine_label = QLabel('OCR引擎: 未加载')
+        self.engine_status_signal.connect(self.engine_label.setText)
+        button_layout.addWidget(self.engine_label)
         layout.addLayout(button_layout)
 
-        # 创建控制台输出部分
-        self.console = QTextEdit()
+        # 性能统计面板，只在开启统计时显示
+        self.stats_label = QLabel()
+        self.stats_label.setWordWrap(True)
+        self.stats_label.setVisible(self.metrics.enabled)
+        layout.addWidget(self.stats_label)
+
+        # 创建控制台输出部分，只保留最近的若干行，消息按批写入
+        logging_config = self.config["logging"]
+        self.console = QPlainTextEdit()
         self.console.setReadOnly(True)
+        self.console.setMaximumBlockCount(logging_config.get("console_max_lines", 2000))
         layout.addWidget(self.console)
+        self.console_timer = QTimer(self)
+        self.console_timer.timeout.connect(self.flush_console)
+        self.console_timer.start(logging_config.get("console_flush_ms", 200))
 
         # 初始化窗口列表
         self.refresh_windows()
         self.logger.info("GUI界面初始化完成")
 
     def refresh_windows(self):
-        self.window_combo.clear()
+        self.window_list.clear()
         def callback(hwnd, windows):
             if win32gui.IsWindowVisible(hwnd):
                 title = win32gui.GetWindowText(hwnd)
@@ -344,42 +114,73 @@ class MainWindow(QMainWindow):
 
         windows = []
         win32gui.EnumWindows(callback, windows)
-        self.window_combo.addItems(windows)
+        self.window_list.addItems(windows)
         self.logger.info(f"已刷新窗口列表，共找到 {len(windows)} 个窗口")
 
+    def preload_engine(self):
+        """界面显示后在后台加载OCR引擎，之后开始/停止识别都复用这个已预热的引擎"""
+        def load():
+            self.engine_status_signal.emit('OCR引擎: 加载中...')
+            start = time.perf_counter()
+            try:
+                self.ocr_service.start()
+            except Exception as e:
+                self.logger.error(f"OCR引擎预加载失败: {str(e)}")
+                self.engine_status_signal.emit('OCR引擎: 加载失败')
+                return
+            self.logger.info(f"OCR引擎预加载完成，耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+            self.engine_status_signal.emit('OCR引擎: 已就绪')
+
+        threading.Thread(target=load, daemon=True).start()
+
     def start_ocr(self):
-        if not self.window_combo.currentText():
+        titles = [item.text() for item in self.window_list.selectedItems()]
+        if not titles:
             self.logger.warning("未选择窗口")
-            QMessageBox.warning(self, '警告', '请先选择一个窗口！')
+            QMessageBox.warning(self, '警告', '请先选择至少一个窗口！')
             return
 
-        self.logger.info(f"开始识别窗口: {self.window_combo.currentText()}")
-        self.start_button.setEnabled(False)
-        self.stop_button.setEnabled(True)
-        self.window_combo.setEnabled(False)
-        self.refresh_button.setEnabled(False)
-
-        self.ocr_thread = OCRThread(self.window_combo.currentText())
-        self.ocr_thread.update_signal.connect(self.update_console)
-        self.ocr_thread.finished_signal.connect(self.ocr_finished)
-        self.ocr_thread.start()
+        self.manager.start(titles)
+        self.update_buttons()
 
     def stop_ocr(self):
-        if self.ocr_thread:
+        if self.manager.sessions:
             self.logger.info("用户停止OCR识别")
-            self.ocr_thread.stop()
-            self.ocr_thread.wait()
-            self.ocr_finished()
+            self.manager.stop()
+            self.update_buttons()
+
+    def update_console(self, title, message):
+        # 多个窗口同时识别时在消息前标注窗口
+        if len(self.manager.sessions) > 1:
+            message = f"[{title}] {message}"
+        self.console_pending.append(message)
+
+    def flush_console(self):
+        """把积累的消息一次性写入控制台"""
+        if not self.console_pending:
+            return
+        max_lines = self.console.maximumBlockCount()
+        messages = self.console_pending[-max_lines:] if max_lines > 0 else self.console_pending
+        self.console_pending = []
+        self.console.appendPlainText("\n".join(messages))
 
-    def update_console(self, message):
-        self.console.append(message)
+    def update_stats(self):
+        self.stats_label.setText(format_stats(self.metrics.snapshot()))
 
-    def ocr_finished(self):
-        self.start_button.setEnabled(True)
-        self.stop_button.setEnabled(False)
-        self.window_combo.setEnabled(True)
-        self.refresh_button.setEnabled(True)
-        self.logger.info("OCR识别已停止")
+    def update_buttons(self):
+        self.stop_button.setEnabled(bool(self.manager.sessions))
+
+    def session_changed(self, title, running):
+        # 会话也可能由控制接口启动或停止
+        self.update_buttons()
+        if not running:
+            self.logger.info(f"OCR识别已停止: {title}")
+
+    def closeEvent(self, event):
+        if self.control_server:
+            self.control_server.stop()
+        self.manager.shutdown()
+        super().closeEvent(event)
 
     def click_text(self, text, confidence=0.7):
         """点击指定文本的中心位置"""
@@ -423,7 +224,8 @@ class MainWindow(QMainWindow):
         """开始识别"""
         try:
             # 获取选中的窗口句柄
-            window_title = self.window_combo.currentText()
+            current_item = self.window_list.currentItem()
+            window_title = current_item.text() if current_item else ""
             if not window_title:
                 QMessageBox.warning(self, "警告", "请先选择要识别的窗口")
                 return
@@ -486,11 +288,15 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "错误", f"识别过程出错: {str(e)}")
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # 打包后OCR工作进程也从这里启动
     # 设置日志记录器
-    logger = setup_logger()
+    logger = setup_logger(load_config()["logging"].get("queue_size", 10000))
     logger.info("程序启动")
     
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    logger.info(f"界面启动耗时: {(time.perf_counter() - APP_START) * 1000:.0f} ms")
+    if window.config["ocr_service"].get("preload", True):
+        QTimer.singleShot(0, window.preload_engine)
     sys.exit(app.exec_()) 
\ No newline at end of file
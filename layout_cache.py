@@ -0,0 +1,119 @@
+import numpy as np
+
+from roi import box_bounds
+
+
+def crop_boxes(img_array, boxes):
+    """按文本框的外接矩形裁剪出待识别的小图"""
+    height, width = img_array.shape[:2]
+    crops = []
+    for box in boxes:
+        x0, y0, x1, y1 = box_bounds(box)
+        x0 = min(max(0, int(x0)), width - 1)
+        y0 = min(max(0, int(y0)), height - 1)
+        x1 = max(x0 + 1, min(width, int(np.ceil(x1))))
+        y1 = max(y0 + 1, min(height, int(np.ceil(y1))))
+        crops.append(np.ascontiguousarray(img_array[y0:y1, x0:x1]))
+    return crops
+
+
+def recognize_crops(ocr, crops):
+    """只做识别(det=False)，返回 [(文本, 置信度), ...]
+
+    外层再包一层列表，PaddleOCR 会把这些小图作为一组交给识别器按批处理，
+    而不是逐张调用。
+    """
+    if not crops:
+        return []
+    result = ocr.ocr([crops], det=False, cls=False)
+    return list(result[0]) if result and result[0] else []
+
+
+def block_diff(fingerprint, reference, block=4):
+    """两个指纹按 block x block 个格子分块求平均绝对差，返回最大的一块
+
+    整帧平均会把局部变化摊薄：一个新出现的按钮只占画面很小一部分，整帧差异可能
+    低于阈值，但它所在分块的差异会很大。
+    """
+    delta = np.abs(fingerprint - reference)
+    height, width = delta.shape
+    bh, bw = min(block, height), min(block, width)
+    delta = delta[:height // bh * bh, :width // bw * bw]
+    return float(delta.reshape(height // bh, bh, width // bw, bw).mean(axis=(1, 3)).max())
+
+
+class LayoutCache:
+    """缓存每个布局上一次整帧检测得到的文本框
+
+    布局以 (任务状态, 区域位置, 图像尺寸) 为键。布局稳定时后续帧只对缓存的文本框做识别，
+    跳过最耗时的DB文本检测；画面布局明显变化、识别置信度下降或复用次数过多时重新检测。
+    布局变化按指纹分块比较，任何一块的差异超过 layout_threshold 都算变化，新出现的按钮不会被整帧平均掩盖。
+    """
+
+    def __init__(self, layout_threshold=6.0, min_confidence=0.5, max_age=20, block=4):
+        self.layout_threshold = layout_threshold
+        self.block = block
+        self.min_confidence = min_confidence
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            layout_threshold=config.get("layout_threshold", 6.0),
+            min_confidence=config.get("min_confidence", 0.5),
+            max_age=config.get("max_age", 20),
+            block=config.get("block", 4),
+        )
+
+    def store(self, key, result, fingerprint):
+        """保存一次完整检测的结果，没有文本时不缓存"""
+        if not result or not result[0]:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = {
+            "boxes": [line[0] for line in result[0]],
+            "confidences": [line[1][1] for line in result[0]],
+            "fingerprint": fingerprint,
+            "age": 0,
+        }
+
+    def lookup(self, key, fingerprint):
+        """返回可以复用的缓存项，布局变化或过期时返回None"""
+        entry = self._entries.get(key)
+        if entry is None or entry["age"] >= self.max_age:
+            self.misses += 1
+            return None
+        reference = entry["fingerprint"]
+        if (reference.shape != fingerprint.shape
+                or block_diff(fingerprint, reference, self.block) > self.layout_threshold):
+            self.misses += 1
+            return None
+        return entry
+
+    def recognize(self, ocr, img_array, key, entry):
+        """只对缓存的文本框做识别，置信度明显下降时作废缓存并返回None"""
+        rec_res = recognize_crops(ocr, crop_boxes(img_array, entry["boxes"]))
+        if len(rec_res) != len(entry["boxes"]):
+            self.misses += 1
+            self.invalidate(key)
+            return None
+
+        for (text, confidence), old in zip(rec_res, entry["confidences"]):
+            # 原来能稳定识别的文本框现在读不出来，说明布局已经变了
+            if old >= self.min_confidence and confidence < self.min_confidence:
+                self.misses += 1
+                self.invalidate(key)
+                return None
+
+        entry["age"] += 1
+        self.hits += 1
+        return [[[box, (text, confidence)] for box, (text, confidence) in zip(entry["boxes"], rec_res)]]
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
@@ -0,0 +1,139 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from datetime import datetime
+
+_listeners = []
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    """把日志记录放进有界队列，由后台线程写文件和控制台；队列满时丢弃并计数，不阻塞识别线程"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 同一进程内传递，格式化留给后台线程
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _start_listener(handler_queue, *handlers):
+    listener = logging.handlers.QueueListener(handler_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return listener
+
+
+def shutdown_logging():
+    """停止后台日志线程，写完队列中剩余的记录"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(shutdown_logging)
+
+
+# 创建日志记录器
+def setup_logger(queue_size=10000):
+    # 创建logs目录（如果不存在）
+    if not os.path.exists('logs'):
+        os.makedirs('logs')
+
+    # 生成日志文件名，包含时间戳
+    log_filename = f'logs/ocr_log_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+
+    # 创建日志记录器
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+    # 创建文件处理器
+    file_handler = logging.FileHandler(log_filename, mode='a', encoding='utf-8')
+    file_handler.setLevel(logging.INFO)
+
+    # 创建控制台处理器
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)
+
+    # 创建格式化器
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    console_handler.setFormatter(formatter)
+
+    # 文件和控制台写入在后台线程中完成，调用方只把记录放进队列
+    log_queue = queue.Queue(maxsize=queue_size)
+    logger.addHandler(_BoundedQueueHandler(log_queue))
+    _start_listener(log_queue, file_handler, console_handler)
+
+    return logger
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, separators=(',', ':'))
+
+
+class EventLog:
+    """紧凑的结构化事件日志，每行一个 JSON 对象；path 为空时所有调用都是空操作"""
+
+    def __init__(self, path="", queue_size=10000):
+        self.enabled = bool(path)
+        self._logger = None
+        if not self.enabled:
+            return
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        handler = logging.FileHandler(path, mode='a', encoding='utf-8')
+        handler.setFormatter(_JsonFormatter())
+        event_queue = queue.Queue(maxsize=queue_size)
+        self._logger = logging.getLogger("ocr.events")
+        self._logger.propagate = False  # 事件只写入事件日志，不进入普通日志
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(_BoundedQueueHandler(event_queue))
+        _start_listener(event_queue, handler)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("events_path", ""), config.get("queue_size", 10000))
+
+    def emit(self, kind, **fields):
+        if not self.enabled:
+            return
+        fields["t"] = round(time.time(), 3)
+        fields["event"] = kind
+        self._logger.info(fields)
+
+
+class DumpLimiter:
+    """限制逐行识别文本的输出：每 interval 秒最多输出一帧，每帧最多 max_lines 行"""
+
+    def __init__(self, interval=1.0, max_lines=20):
+        self.interval = interval
+        self.max_lines = max_lines
+        self.suppressed = 0  # 因限速没有输出的帧数
+        self._last = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("dump_interval", 1.0), config.get("dump_max_lines", 20))
+
+    def select(self, lines):
+        """返回本帧应该输出的行"""
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            self.suppressed += 1
+            return []
+        self._last = now
+        return lines[:self.max_lines]
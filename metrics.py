@@ -0,0 +1,300 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from proxy import EngineProxy
+
+# 统计的各个阶段，面板和导出文件按这个顺序排列
+STAGES = ["capture", "convert", "template", "det", "cls", "rec", "ocr", "match", "click", "verify"]
+COUNTERS = ["frames", "skipped_frames", "clicks", "transitions", "errors"]
+
+
+class RollingHistogram:
+    """保留最近 size 个样本的耗时分布，读取时才排序计算分位数"""
+
+    def __init__(self, size=1024):
+        self._samples = collections.deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self._samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        samples = sorted(self._samples)
+        if not samples:
+            return {}
+        last = len(samples) - 1
+        return {q: samples[min(last, int(q * len(samples)))] for q in quantiles}
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """关闭统计时使用：所有方法都是空操作，热路径上不计时也不分配对象"""
+
+    enabled = False
+
+    def timer(self, stage):
+        return _NULL_TIMER
+
+    def observe(self, stage, seconds):
+        pass
+
+    def inc(self, name, n=1):
+        pass
+
+    def set_gauge(self, name, value, window=""):
+        pass
+
+    def snapshot(self):
+        return {}
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class MetricsRecorder:
+    """在OCR工作进程中记录耗时和计数，随识别结果传回主进程后合并到 Metrics"""
+
+    enabled = True
+
+    def __init__(self):
+        self._observations = []
+        self._counters = collections.Counter()
+
+    def timer(self, stage):
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        self._observations.append((stage, seconds))
+
+    def inc(self, name, n=1):
+        self._counters[name] += n
+
+    def set_gauge(self, name, value, window=""):
+        pass
+
+    def drain(self):
+        """取出并清空已记录的数据，返回 (耗时列表, 计数)"""
+        observations, counters = self._observations, dict(self._counters)
+        self._observations = []
+        self._counters.clear()
+        return observations, counters
+
+
+class Metrics:
+    """各阶段耗时分布、计数器和指标，定期写入 JSON 和 Prometheus 文本文件"""
+
+    enabled = True
+
+    def __init__(self, path="metrics.json", prometheus_path="metrics.prom", interval=5.0, window=1024):
+        self.path = path
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self.window = window
+        self.logger = logging.getLogger()
+        self._histograms = {}
+        self._counters = collections.Counter()
+        self._gauges = {}  # (名称, 窗口) -> 值
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = time.time()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            path=config.get("path", "metrics.json"),
+            prometheus_path=config.get("prometheus_path", "metrics.prom"),
+            interval=config.get("interval", 5.0),
+            window=config.get("window", 1024),
+        )
+
+    def timer(self, stage):
+        """with metrics.timer("capture"): ... 记录代码块耗时"""
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, RollingHistogram(self.window))
+        histogram.observe(seconds)
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def set_gauge(self, name, value, window=""):
+        self._gauges[(name, window)] = value
+
+    def snapshot(self):
+        """当前统计的快照，耗时单位为毫秒"""
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        stages = {}
+        for stage in sorted(histograms, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+            histogram = histograms[stage]
+            values = histogram.percentiles()
+            if not values:
+                continue
+            stages[stage] = {
+                "count": histogram.count,
+                "sum_ms": round(histogram.total * 1000, 1),
+                "p50_ms": round(values[0.5] * 1000, 2),
+                "p95_ms": round(values[0.95] * 1000, 2),
+                "p99_ms": round(values[0.99] * 1000, 2),
+            }
+        gauges = collections.defaultdict(dict)
+        for (name, window), value in list(self._gauges.items()):
+            gauges[name][window] = value
+        return {
+            "timestamp": time.time(),
+            "uptime_seconds": round(time.time() - self._started, 1),
+            "stages": stages,
+            "counters": {name: counters.get(name, 0) for name in sorted(set(COUNTERS) | set(counters))},
+            "gauges": dict(gauges),
+        }
+
+    def prometheus_text(self, snapshot):
+        """按 Prometheus 文本格式输出快照"""
+        lines = ["# TYPE ocr_stage_seconds summary"]
+        for stage, values in snapshot["stages"].items():
+            for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                lines.append(f'ocr_stage_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                             f'{values[key] / 1000:.6f}')
+            lines.append(f'ocr_stage_seconds_sum{{stage="{stage}"}} {values["sum_ms"] / 1000:.6f}')
+            lines.append(f'ocr_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE ocr_{name}_total counter")
+            lines.append(f"ocr_{name}_total {value}")
+        for name, windows in snapshot["gauges"].items():
+            lines.append(f"# TYPE ocr_{name} gauge")
+            for window, value in windows.items():
+                label = window.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'ocr_{name}{{window="{label}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """把当前快照写入文件（先写临时文件再替换，读取方不会读到写了一半的文件）"""
+        snapshot = self.snapshot()
+        outputs = []
+        if self.path:
+            outputs.append((self.path, json.dumps(snapshot, ensure_ascii=False, indent=2)))
+        if self.prometheus_path:
+            outputs.append((self.prometheus_path, self.prometheus_text(snapshot)))
+        for path, text in outputs:
+            try:
+                tmp_path = path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                self.logger.error(f"写入性能统计失败: {str(e)}")
+        return snapshot
+
+    def start(self):
+        """启动后台导出线程"""
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._export_loop, daemon=True)
+        self._thread.start()
+
+    def _export_loop(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def stop(self):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.export()
+
+
+class _TimedCall(EngineProxy):
+    """包装引擎内部的检测器/分类器/识别器，调用时记录耗时"""
+
+    def __init__(self, target, metrics, stage):
+        super().__init__(target)
+        self._metrics = metrics
+        self._stage = stage
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._target(*args, **kwargs)
+        finally:
+            self._metrics.observe(self._stage, time.perf_counter() - start)
+
+
+def instrument_engine(engine, metrics):
+    """为 PaddleOCR 引擎的检测、方向分类和识别阶段加上计时"""
+    for attr, stage in (("text_detector", "det"), ("text_classifier", "cls"), ("text_recognizer", "rec")):
+        target = getattr(engine, attr, None)
+        if target is not None and not isinstance(target, _TimedCall):
+            setattr(engine, attr, _TimedCall(target, metrics, stage))
+    return engine
+
+
+def create_metrics(config):
+    """根据配置创建统计对象，关闭时返回空操作的 NullMetrics"""
+    if config.get("enabled", False):
+        return Metrics.from_config(config)
+    return NullMetrics()
+
+
+def format_stats(snapshot):
+    """统计面板显示的文本"""
+    if not snapshot:
+        return ""
+    parts = [f"{stage} p50/p95 {v['p50_ms']:.0f}/{v['p95_ms']:.0f}ms" for stage, v in snapshot["stages"].items()]
+    counters = snapshot["counters"]
+    parts.append(f"帧 {counters.get('frames', 0)} 跳过 {counters.get('skipped_frames', 0)} "
+                 f"点击 {counters.get('clicks', 0)} 切换 {counters.get('transitions', 0)} "
+                 f"错误 {counters.get('errors', 0)}")
+    cache_hits = counters.get("rec_cache_hits", 0)
+    cache_total = cache_hits + counters.get("rec_cache_misses", 0)
+    if cache_total:
+        parts.append(f"识别缓存命中率 {cache_hits / cache_total:.0%}")
+    rounds = snapshot["gauges"].get("rounds_per_hour", {})
+    if rounds:
+        parts.append("每小时轮数 " + ", ".join(f"{v:.1f}" for v in rounds.values()))
+    return " | ".join(parts)
@@ -0,0 +1,274 @@
+import collections
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from batching import BatchRunner
+from engines import EngineSet, create_engine, merge_profiles, run_engine
+from metrics import NullMetrics
+from rec_cache import RecognitionCache
+
+
+class EngineClient:
+    """某个窗口会话使用的OCR接口，用法与 PaddleOCR.ocr 相同，请求交给共享服务执行"""
+
+    def __init__(self, service, session_id):
+        self.service = service
+        self.session_id = session_id
+        self.profile = None  # 引擎配置名，None 使用服务的默认配置；会话按任务状态设置
+
+    def ocr(self, img, **kwargs):
+        if self.profile and "profile" not in kwargs:
+            kwargs["profile"] = self.profile
+        return self.service.submit(self.session_id, img, **kwargs).result()
+
+    def ocr_many(self, images, **kwargs):
+        """一次提交多张图像，由各工作线程（进程）同时处理，按顺序返回结果"""
+        if self.profile and "profile" not in kwargs:
+            kwargs["profile"] = self.profile
+        futures = [self.service.submit(self.session_id, img, **kwargs) for img in images]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self.service.remove_session(self.session_id)
+
+
+class OCRService:
+    """多个窗口共享的OCR引擎服务
+
+    每个工作线程持有自己的引擎，内存只随工作线程数和用到的引擎配置数增长，与窗口数无关。
+    请求参数中的 profile 选择引擎配置（见 engines.DEFAULT_PROFILES），省略时使用 default_profile。
+    每个会话有自己的请求队列，工作线程按轮询顺序从各会话取请求，避免某个窗口独占引擎。
+    batch_size 大于1时，工作线程会在 max_wait_ms 内收集多个会话的请求合并推理。
+    """
+
+    def __init__(self, workers=1, engine_factory=create_engine, batch_size=1, max_wait_ms=10,
+                 max_pad_ratio=0.25, rec_batch_num=None, warm=True, metrics=None, rec_cache=None,
+                 profiles=None, default_profile="accurate"):
+        self.worker_count = max(1, workers)
+        self.engine_factory = engine_factory  # engine_factory(**引擎配置的options) 创建引擎
+        self.profiles = profiles or merge_profiles()
+        self.default_profile = default_profile
+        self.warm = warm  # 引擎创建后先做一次预热推理
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_pad_ratio = max_pad_ratio
+        self.rec_batch_num = rec_batch_num
+        self.metrics = metrics or NullMetrics()  # 检测/方向分类/识别各阶段耗时
+        self.rec_cache = rec_cache  # 文本框识别结果缓存，所有工作线程共用
+        self._runners = []
+        self.logger = logging.getLogger()
+        self.processed = collections.Counter()  # 每个会话已完成的请求数
+        self._queues = collections.OrderedDict()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._ready = threading.Event()
+        self._init_error = None
+        self._started = 0
+        self._running = False
+
+    def start(self):
+        """启动工作线程并等待引擎初始化完成，已启动时只等待初始化完成"""
+        with self._cond:
+            if not self._running:
+                self._running = True
+                self._ready.clear()
+                self._init_error = None
+                self._started = 0
+                for i in range(self.worker_count):
+                    thread = threading.Thread(target=self._worker, args=(i,), daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        self._ready.wait()
+        if self._init_error:
+            error = self._init_error
+            self.stop()
+            raise error
+
+    @staticmethod
+    def engine_factory_from_config(config):
+        """按配置创建引擎的函数，引擎配置的 options 可覆盖这里的参数；使用 functools.partial 以便传给工作进程"""
+        options = {"engine": config.get("engine", "paddle")}
+        if config.get("cpu_threads"):
+            options["cpu_threads"] = config["cpu_threads"]
+        return functools.partial(create_engine, **options)
+
+    @classmethod
+    def from_config(cls, config, metrics=None):
+        batching = config.get("batching", {})
+        cache_config = config.get("rec_cache", {})
+        rec_cache = None
+        if cache_config.get("enabled", True):
+            rec_cache = RecognitionCache.from_config(cache_config, metrics)
+        return cls(
+            workers=config.get("workers", 1),
+            engine_factory=cls.engine_factory_from_config(config),
+            batch_size=batching.get("batch_size", 1),
+            max_wait_ms=batching.get("max_wait_ms", 10),
+            max_pad_ratio=batching.get("max_pad_ratio", 0.25),
+            rec_batch_num=batching.get("rec_batch_num"),
+            warm=config.get("warm_up", True),
+            metrics=metrics,
+            rec_cache=rec_cache,
+            profiles=merge_profiles(config.get("profiles")),
+            default_profile=config.get("profile", "accurate"),
+        )
+
+    def is_ready(self):
+        return self._running and self._ready.is_set() and self._init_error is None
+
+    def batch_stats(self):
+        """各工作线程的批量推理统计"""
+        return [runner.stats.summary() for runner in self._runners]
+
+    def client(self, session_id):
+        with self._cond:
+            self._queues.setdefault(session_id, collections.deque())
+        return EngineClient(self, session_id)
+
+    def remove_session(self, session_id):
+        with self._cond:
+            queue = self._queues.pop(session_id, None)
+        for _, _, future in queue or ():
+            future.cancel()
+
+    def submit(self, session_id, img, **kwargs):
+        future = Future()
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("OCR服务未启动")
+            self._queues.setdefault(session_id, collections.deque()).append((img, kwargs, future))
+            self._cond.notify()
+        return future
+
+    def _next_job(self):
+        """按轮询顺序取下一个请求，取过的会话移到队尾"""
+        for session_id, queue in self._queues.items():
+            if queue:
+                self._queues.move_to_end(session_id)
+                return session_id, queue.popleft()
+        return None
+
+    def _collect(self):
+        """取一批请求：至少一个，之后在等待时限内继续收集其他会话的请求"""
+        with self._cond:
+            job = self._next_job()
+            while job is None and self._running:
+                self._cond.wait()
+                job = self._next_job()
+            if job is None:
+                return None
+            jobs = [job]
+            deadline = time.monotonic() + self.max_wait
+            # 所有会话都已经在这一批里时不必再等
+            while len(jobs) < self.batch_size and len(self._queues) > len(jobs):
+                job = self._next_job()
+                if job is not None:
+                    jobs.append(job)
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    break
+                self._cond.wait(remaining)
+            return jobs
+
+    def create_engine_set(self):
+        return EngineSet(self.engine_factory, self.profiles, self.default_profile, self.warm,
+                         self.metrics, self.rec_cache)
+
+    def _worker(self, index):
+        try:
+            engines = self.create_engine_set()
+            engines.engine()  # 默认配置的引擎立即创建，其他配置第一次用到时再创建
+            self.logger.info(f"OCR引擎 {index} 初始化完成")
+        except Exception as e:
+            self._init_error = e
+            self._ready.set()
+            return
+
+        runners = {}  # 引擎键 -> 批量推理，引擎不支持时为None
+
+        with self._cond:
+            self._started += 1
+            if self._started == self.worker_count:
+                self._ready.set()
+
+        while True:
+            jobs = self._collect()
+            if jobs is None:
+                break
+            jobs = [(session_id, job) for session_id, job in jobs if job[2].set_running_or_notify_cancel()]
+            if not jobs:
+                continue
+
+            # 按引擎分组，同一个引擎的请求才能合并推理
+            groups = collections.OrderedDict()
+            for session_id, (img, kwargs, future) in jobs:
+                try:
+                    engine, key, call = engines.resolve(kwargs)
+                except Exception as e:
+                    future.set_exception(e)
+                    self.processed[session_id] += 1
+                    continue
+                groups.setdefault(key, (engine, []))[1].append((session_id, (img, call, future)))
+            for key, (engine, group) in groups.items():
+                self._run_group(engine, self._runner(runners, key, engine), group)
+
+    def _runner(self, runners, key, engine):
+        if self.batch_size <= 1:
+            return None
+        if key not in runners:
+            try:
+                runners[key] = BatchRunner(engine, self.max_pad_ratio, self.rec_batch_num, self.metrics)
+                self._runners.append(runners[key])
+            except Exception as e:
+                runners[key] = None
+                self.logger.error(f"引擎不支持批量推理，改为逐个识别: {str(e)}")
+        return runners[key]
+
+    def _run_group(self, engine, runner, jobs):
+        if runner:
+            try:
+                results = runner.run([(img, kwargs) for _, (img, kwargs, _) in jobs])
+                for (session_id, (_, _, future)), result in zip(jobs, results):
+                    future.set_result(result)
+                    self.processed[session_id] += 1
+                if runner.stats.batches % 100 == 0:
+                    self.logger.info(f"批量推理统计: {runner.stats.summary()}")
+                return
+            except Exception as e:
+                self.logger.error(f"批量推理失败，改为逐个识别: {str(e)}")
+
+        for session_id, (img, kwargs, future) in jobs:
+            try:
+                future.set_result(run_engine(engine, img, kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            self.processed[session_id] += 1
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            for queue in self._queues.values():
+                for _, _, future in queue:
+                    future.cancel()
+                queue.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        # 下次 start 时工作线程会创建新的批量执行器，旧的不再保留
+        self._runners = []
+        if self.rec_cache is not None:
+            self.rec_cache.save()
+            self.logger.info(f"识别结果缓存统计: {self.rec_cache.stats()}")
+
+
+def create_ocr_service(config, metrics=None):
+    """按配置创建OCR服务：thread 在本进程的线程中推理，process 在独立的工作进程中推理"""
+    if config.get("mode", "thread") == "process":
+        from process_service import ProcessOCRService
+        return ProcessOCRService.from_config(config, metrics)
+    return OCRService.from_config(config, metrics)
@@ -0,0 +1,234 @@
+import collections
+import logging
+import threading
+import time
+
+from screen import CaptureFinished
+
+
+class Frame:
+    """在流水线中传递的一帧"""
+
+    __slots__ = ("seq", "epoch", "image", "timestamp", "changed")
+
+    def __init__(self, seq, epoch, image, timestamp, changed=True):
+        self.seq = seq              # 截图序号
+        self.epoch = epoch          # 截图时已发出的动作数，用于判断帧是否在点击前截取
+        self.image = image
+        self.timestamp = timestamp
+        self.changed = changed      # 识别线程中的画面变化检测结果
+
+
+class LatestQueue:
+    """有界队列；drop_stale 时满了丢弃最旧的元素，否则阻塞等待消费者"""
+
+    def __init__(self, maxsize=1, drop_stale=True):
+        self.maxsize = max(1, maxsize)
+        self.drop_stale = drop_stale
+        self.dropped = 0
+        self._items = collections.deque()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            while len(self._items) >= self.maxsize and not self._closed:
+                if self.drop_stale:
+                    self._items.popleft()
+                    self.dropped += 1
+                    break
+                self._cond.wait(0.1)
+            if self._closed:
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """取出一个元素，队列关闭且为空或超时时返回None"""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class ActionExecutor:
+    """动作执行线程：按顺序执行点击等动作，识别线程提交后立即返回"""
+
+    def __init__(self, on_done=None):
+        self.logger = logging.getLogger()
+        self.issued = 0      # 已提交的动作数
+        self.completed = 0   # 已执行完成（含动作后等待）的动作数
+        self.coalesced = 0   # 与尚未完成的上一个动作重复而被合并的动作数
+        self.on_done = on_done
+        self._last_key = None
+        self._queue = LatestQueue(maxsize=64, drop_stale=False)
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, action, delay_after=0.0, key=None):
+        """提交一个动作，返回该动作的序号
+
+        key 相同且上一个动作还没执行完时直接合并，例如对同一位置的重复点击。
+        """
+        with self._idle:
+            if key is not None and key == self._last_key and self.pending():
+                self.coalesced += 1
+                return self.issued
+            self.issued += 1
+            epoch = self.issued
+            self._last_key = key
+        self._queue.put((epoch, action, delay_after))
+        return epoch
+
+    def pending(self):
+        return self.completed < self.issued
+
+    def wait_idle(self, timeout=None):
+        """等待所有已提交的动作执行完"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self.pending(), timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            epoch, action, delay_after = item
+            try:
+                action()
+                if delay_after > 0:
+                    time.sleep(delay_after)
+            except Exception as e:
+                self.logger.error(f"执行动作失败: {str(e)}")
+            with self._idle:
+                self.completed = epoch
+                self._idle.notify_all()
+            if self.on_done:
+                self.on_done()
+
+    def stop(self):
+        """停止执行线程，尚未执行的动作直接丢弃"""
+        self._queue.clear()
+        self._queue.close()
+        self._thread.join()
+        with self._idle:
+            self.completed = self.issued
+            self._idle.notify_all()
+
+
+class FramePipeline:
+    """截图 → OCR → 动作 三段流水线
+
+    截图线程按识别间隔取帧，放入只保留最新帧的队列；
+    识别线程取帧做OCR并匹配任务，点击交给 ActionExecutor 异步执行。
+    在点击完成之前截取的帧会被丢弃，点击完成后立即截取下一帧，不必等满一个识别间隔。
+    """
+
+    def __init__(self, capture, process, interval, is_running, on_error=None,
+                 queue_size=1, paced=False, max_in_flight=None):
+        self.capture = capture        # capture(epoch) -> Frame，序号由流水线填写
+        self.process = process        # process(frame)
+        self.interval = interval      # interval() -> 当前识别间隔（秒）
+        self.is_running = is_running  # is_running() -> bool
+        self.on_error = on_error or (lambda message: None)
+        self.paced = paced            # 截图后端自己控制节奏（回放）时不丢帧、不等待
+        # 截图后端复用缓冲区时，尚未处理完的帧数不能超过缓冲区数量，否则会被新截图覆盖
+        self.max_in_flight = max_in_flight
+        self.logger = logging.getLogger()
+        self.stale_frames = 0
+        self.captured = 0      # 已截取的帧数，也是最新一帧的序号
+        self.oldest_live = 1   # 仍可能被识别线程使用的最早一帧的序号
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.frames = LatestQueue(maxsize=queue_size, drop_stale=not paced)
+        self.executor = ActionExecutor(on_done=self._wake.set)
+
+    def stop(self):
+        """通知截图线程尽快退出，不必等完当前识别间隔"""
+        self._stopped.set()
+        self._wake.set()
+
+    def submit_action(self, action, delay_after=0.0, key=None):
+        return self.executor.submit(action, delay_after, key)
+
+    def _capture_loop(self):
+        try:
+            while self.is_running() and not self._stopped.is_set():
+                # 还有点击没执行完时截图没有意义
+                if self.executor.pending():
+                    self.executor.wait_idle(0.1)
+                    continue
+                if self.max_in_flight and self.captured + 1 - self.oldest_live >= self.max_in_flight:
+                    time.sleep(0.01)
+                    continue
+                try:
+                    frame = self.capture(self.executor.issued)
+                except CaptureFinished:
+                    self.logger.info("截图来源已读取完毕，停止识别")
+                    break
+                except Exception as e:
+                    self.on_error(f"截图出错: {str(e)}")
+                    time.sleep(1)
+                    continue
+                self.captured += 1
+                frame.seq = self.captured
+                self.frames.put(frame)
+                if not self.paced:
+                    self._wake.wait(self.interval())
+                    self._wake.clear()
+        finally:
+            self.frames.close()
+
+    def _process_loop(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            self.oldest_live = frame.seq
+            if self.paced:
+                # 回放时保持确定性：等动作执行完再处理下一帧
+                self.executor.wait_idle()
+            elif frame.epoch < self.executor.issued:
+                self.stale_frames += 1
+                self.oldest_live = frame.seq + 1
+                continue
+            try:
+                self.process(frame)
+            except Exception as e:
+                self.on_error(f"识别过程出错: {str(e)}")
+                time.sleep(1)
+            self.oldest_live = frame.seq + 1
+
+    def run(self):
+        """运行流水线，直到 is_running() 为False或截图来源结束"""
+        capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        capture_thread.start()
+        try:
+            self._process_loop()
+        finally:
+            self._stopped.set()
+            self._wake.set()
+            self.frames.close()
+            capture_thread.join()
+            self.executor.stop()
+        self.logger.info(f"流水线结束，丢弃过期帧 {self.stale_frames} 帧，覆盖未处理帧 {self.frames.dropped} 帧")
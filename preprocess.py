@@ -0,0 +1,223 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+# 校准得到的分辨率配置保存路径
+PROFILE_FILE = 'preprocess_profiles.json'
+
+
+def shape_key(shape):
+    """分辨率键，例如 1280x720"""
+    return f"{shape[1]}x{shape[0]}"
+
+
+def resize(img_array, scale):
+    """按比例缩小图像；cv2 随 PaddleOCR 一起安装，在这里才导入"""
+    import cv2
+    height, width = img_array.shape[:2]
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(img_array, size, interpolation=cv2.INTER_AREA)
+
+
+class Preprocessor:
+    """OCR前的预处理：裁掉边缘、缩小、转灰度，识别结果再换算回原图坐标"""
+
+    def __init__(self, scale=1.0, grayscale=False, margins=None, det_limit_side_len=None):
+        self.scale = scale
+        self.grayscale = grayscale
+        self.margins = margins or [0, 0, 0, 0]  # 相对比例 [左, 上, 右, 下]
+        self.det_limit_side_len = det_limit_side_len  # 检测器输入的最长边，None 使用引擎默认值
+
+    def crop_margins(self, img_array):
+        """裁掉窗口边缘（标题栏、边框等不含目标的区域），返回 (图像, 左上角偏移)"""
+        left, top, right, bottom = self.margins
+        if not (left or top or right or bottom):
+            return img_array, (0, 0)
+        height, width = img_array.shape[:2]
+        x0, y0 = int(width * left), int(height * top)
+        x1, y1 = width - int(width * right), height - int(height * bottom)
+        return img_array[y0:y1, x0:x1], (x0, y0)
+
+    def apply(self, img_array):
+        if self.scale != 1.0:
+            img_array = resize(img_array, self.scale)
+        if self.grayscale and img_array.ndim == 3:
+            # 检测器和识别器都需要三通道输入
+            gray = img_array[..., :3].mean(axis=2, dtype=np.float32).astype(np.uint8)
+            img_array = np.repeat(gray[..., None], 3, axis=2)
+        return img_array
+
+    def restore(self, result):
+        """把缩放后图像上的OCR结果换算回原图坐标"""
+        if self.scale == 1.0 or not result or not result[0]:
+            return result
+        factor = 1.0 / self.scale
+        return [[[[[p[0] * factor, p[1] * factor] for p in line[0]], line[1]] for line in result[0]]]
+
+    def ocr_kwargs(self):
+        if self.det_limit_side_len:
+            return {"det_limit_side_len": self.det_limit_side_len}
+        return {}
+
+
+class PreprocessProfiles:
+    """按窗口分辨率选择预处理参数：优先使用校准文件中的配置，没有时使用默认配置"""
+
+    def __init__(self, default=None, profiles=None, path=PROFILE_FILE):
+        self.default = default or {}
+        self.profiles = profiles or {}
+        self.path = path
+        self.logger = logging.getLogger()
+        self._cache = {}
+        self.load()
+
+    @classmethod
+    def from_config(cls, config):
+        default = {key: config[key] for key in ("scale", "grayscale", "margins", "det_limit_side_len")
+                   if key in config}
+        return cls(default, config.get("profiles"), config.get("profile_path", PROFILE_FILE))
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                calibrated = json.load(f)
+            # 配置文件中手动写的分辨率优先
+            for key, profile in calibrated.items():
+                self.profiles.setdefault(key, profile)
+            self.logger.info(f"已加载预处理校准配置: {', '.join(calibrated)}")
+        except Exception as e:
+            self.logger.error(f"读取预处理校准配置失败: {str(e)}")
+
+    def for_shape(self, shape):
+        key = shape_key(shape)
+        preprocessor = self._cache.get(key)
+        if preprocessor is None:
+            options = dict(self.default)
+            profile = self.profiles.get(key, {})
+            options.update({k: profile[k] for k in ("scale", "grayscale", "margins", "det_limit_side_len")
+                            if k in profile})
+            preprocessor = Preprocessor(**options)
+            self._cache[key] = preprocessor
+            if profile:
+                self.logger.info(f"分辨率 {key} 使用校准的预处理参数: {options}")
+        return preprocessor
+
+
+def load_frames(path):
+    """读取校准用的截图：图片文件/目录，或录制目录"""
+    from screen import CaptureFinished, FileCaptureBackend
+    if os.path.exists(os.path.join(path, "index.jsonl")):
+        from recorder import ReplayCaptureBackend
+        backend = ReplayCaptureBackend(path, realtime=False, loop=False)
+    else:
+        backend = FileCaptureBackend(path, loop=False)
+    frames = []
+    with backend:
+        while True:
+            try:
+                frames.append(np.ascontiguousarray(backend.capture()))
+            except CaptureFinished:
+                break
+    return frames
+
+
+def found_keywords(automaton, result):
+    if not result or not result[0]:
+        return set()
+    found = set()
+    for line in result[0]:
+        found |= automaton.search(line[1][0])
+    return found
+
+
+def calibrate(frames, keywords, scales, limits, grayscale_options, engine):
+    """对每种分辨率找出仍能识别出全部目标关键词、耗时最短的预处理参数"""
+    from rules import KeywordAutomaton
+    automaton = KeywordAutomaton([(variant, keyword) for keyword, variants in keywords.items()
+                                  for variant in variants])
+    logger = logging.getLogger()
+    groups = {}
+    for frame in frames:
+        groups.setdefault(shape_key(frame.shape), []).append(frame)
+
+    profiles = {}
+    for key, images in groups.items():
+        # 原图、引擎默认参数下能找到的关键词是基准
+        baseline = [found_keywords(automaton, engine.ocr(img, cls=True)) for img in images]
+        logger.info(f"{key}: {len(images)} 张截图，基准关键词 {sorted(set().union(*baseline))}")
+
+        best = None
+        for scale in scales:
+            for limit in limits:
+                for grayscale in grayscale_options:
+                    preprocessor = Preprocessor(scale, grayscale, det_limit_side_len=limit)
+                    elapsed = 0.0
+                    complete = True
+                    for img, expected in zip(images, baseline):
+                        start = time.perf_counter()
+                        result = run_with_limit(engine, preprocessor.apply(img), limit)
+                        elapsed += time.perf_counter() - start
+                        if not expected <= found_keywords(automaton, result):
+                            complete = False
+                            break
+                    if not complete:
+                        continue
+                    ms = elapsed * 1000 / len(images)
+                    logger.info(f"{key}: scale={scale} limit={limit} grayscale={grayscale} 平均 {ms:.1f} ms")
+                    if best is None or ms < best["ms"]:
+                        best = {"scale": scale, "grayscale": grayscale, "det_limit_side_len": limit,
+                                "ms": round(ms, 1), "images": len(images)}
+        if best:
+            profiles[key] = best
+            logger.info(f"{key}: 选择 {best}")
+        else:
+            logger.warning(f"{key}: 没有能找到全部关键词的参数组合，保持默认")
+    return profiles
+
+
+def run_with_limit(engine, img, limit):
+    from engines import run_engine
+    kwargs = {"cls": True}
+    if limit:
+        kwargs["det_limit_side_len"] = limit
+    return run_engine(engine, img, kwargs)
+
+
+def _parse_list(text, cast):
+    return [None if item in ("", "none", "None") else cast(item) for item in text.split(",")]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="按截图校准每种窗口分辨率的OCR预处理参数")
+    parser.add_argument("path", help="截图文件、截图目录或录制目录")
+    parser.add_argument("--tasks", default="tasks.json", help="任务流程配置，从中读取要点击的目标文本")
+    parser.add_argument("--output", default=PROFILE_FILE)
+    parser.add_argument("--scales", default="1.0,0.85,0.75,0.6,0.5")
+    parser.add_argument("--limits", default="none,960,736,640", help="检测器输入最长边，none 为引擎默认值")
+    parser.add_argument("--grayscale", default="false,true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from engines import create_paddle_ocr
+    from rules import load_task_flow
+    flow = load_task_flow(args.tasks)
+    keywords = {rule.name: rule.variants for state in flow.states.values()
+                for rule in state.rules if rule.action == "click"}
+    frames = load_frames(args.path)
+    profiles = calibrate(
+        frames,
+        keywords,
+        scales=_parse_list(args.scales, float),
+        limits=_parse_list(args.limits, int),
+        grayscale_options=[item == "true" for item in args.grayscale.split(",")],
+        engine=create_paddle_ocr(),
+    )
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, ensure_ascii=False, indent=2)
+    print(json.dumps(profiles, ensure_ascii=False, indent=2))
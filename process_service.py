@@ -0,0 +1,276 @@
+import logging
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engines import EngineSet, merge_profiles
+from metrics import MetricsRecorder
+from ocr_service import OCRService
+
+
+class FrameSlots:
+    """一个工作进程使用的共享内存环形槽位，帧直接写入共享内存，不经过pickle"""
+
+    def __init__(self, count=2, size=1280 * 720 * 3):
+        self.count = max(1, count)
+        self.slots = [shared_memory.SharedMemory(create=True, size=size) for _ in range(self.count)]
+        self.next = 0
+
+    def acquire(self, nbytes):
+        """取下一个槽位，返回 (槽位序号, 共享内存)；容量不够时换一块更大的共享内存（名字随之改变）"""
+        index = self.next
+        self.next = (self.next + 1) % self.count
+        slot = self.slots[index]
+        if slot.size < nbytes:
+            self._release(slot)
+            slot = shared_memory.SharedMemory(create=True, size=int(nbytes * 1.25))
+            self.slots[index] = slot
+        return index, slot
+
+    @staticmethod
+    def _release(slot):
+        slot.close()
+        try:
+            slot.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        for slot in self.slots:
+            self._release(slot)
+        self.slots = []
+
+
+def _array_bytes(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    return sum(_array_bytes(item) for item in obj)
+
+
+def pack(obj, buf, offset=0):
+    """把图像（或整帧识别时的小图嵌套列表）写入共享内存，返回 (描述, 下一个偏移)"""
+    if isinstance(obj, np.ndarray):
+        array = np.ndarray(obj.shape, dtype=obj.dtype, buffer=buf, offset=offset)
+        np.copyto(array, obj)
+        return ("array", offset, obj.shape, obj.dtype.str), offset + obj.nbytes
+    items = []
+    for item in obj:
+        desc, offset = pack(item, buf, offset)
+        items.append(desc)
+    return ("list", items), offset
+
+
+def unpack(desc, buf):
+    """按描述从共享内存取出图像视图"""
+    if desc[0] == "array":
+        _, offset, shape, dtype = desc
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=buf, offset=offset)
+    return [unpack(item, buf) for item in desc[1]]
+
+
+def _worker_main(conn, engine_factory, profiles, default_profile, warm, rec_cache_config, save_cache,
+                 collect_metrics=False):
+    """工作进程：创建引擎后循环处理请求，图像从共享内存读取，只把识别结果传回
+
+    开启统计时各阶段耗时和缓存命中数记录在本进程中，随每个结果一起传回主进程。
+    """
+    logger = logging.getLogger()
+    recorder = MetricsRecorder() if collect_metrics else None
+    try:
+        cache = None
+        if rec_cache_config and rec_cache_config.get("enabled", True):
+            from rec_cache import RecognitionCache
+            cache = RecognitionCache.from_config(rec_cache_config, recorder)
+        engines = EngineSet(engine_factory, profiles, default_profile, warm, metrics=recorder, rec_cache=cache)
+        start = time.perf_counter()
+        engines.engine()  # 默认配置的引擎立即创建，其他配置第一次用到时再创建
+        warm_ms = (time.perf_counter() - start) * 1000
+    except Exception as e:
+        conn.send(("error", None, f"{type(e).__name__}: {e}", None))
+        return
+    conn.send(("ready", None, warm_ms, None))
+
+    attached = {}  # 槽位序号 -> 已映射的共享内存
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            job_id, index, name, desc, kwargs = message
+            try:
+                slot = attached.get(index)
+                if slot is None or slot.name != name:
+                    # 主进程换了更大的共享内存，旧的映射不再使用，及时关闭以释放内存
+                    if slot is not None:
+                        slot.close()
+                    slot = attached[index] = shared_memory.SharedMemory(name=name)
+                result = engines.run(unpack(desc, slot.buf), kwargs)
+                conn.send(("ok", job_id, result, recorder.drain() if recorder else None))
+            except Exception as e:
+                conn.send(("error", job_id, f"{type(e).__name__}: {e}", recorder.drain() if recorder else None))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        for slot in attached.values():
+            slot.close()
+        if cache is not None and save_cache:
+            cache.save()
+        logger.info("OCR工作进程退出")
+
+
+class ProcessOCRService(OCRService):
+    """在独立进程中运行OCR引擎的服务，接口与 OCRService 相同
+
+    每个工作线程管理一个工作进程和它的共享内存槽位：请求的图像写入槽位，通过管道只发送槽位名和形状，
+    工作进程把识别结果传回。工作进程崩溃或超过 timeout 秒没有响应时自动重启，未完成的请求返回错误。
+    启动时导入引擎、加载模型和预热可能很慢（第一次运行还要下载模型），单独使用 startup_timeout 限制。
+    """
+
+    def __init__(self, workers=1, slots=2, timeout=30.0, startup_timeout=600.0, rec_cache_config=None, **kwargs):
+        super().__init__(workers=workers, **kwargs)
+        self.slot_count = max(1, slots)
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout  # None 表示一直等到工作进程就绪或退出
+        self.rec_cache_config = rec_cache_config
+        self.restarts = 0
+        # 每个进程同时最多处理 slots 个请求，按槽位数收集请求
+        self.batch_size = max(self.batch_size, self.slot_count)
+        self._context = multiprocessing.get_context("spawn")
+
+    @classmethod
+    def from_config(cls, config, metrics=None):
+        process_config = config.get("process", {})
+        return cls(
+            workers=config.get("workers", 1),
+            slots=process_config.get("slots", 2),
+            timeout=process_config.get("timeout", 30.0),
+            startup_timeout=process_config.get("startup_timeout", 600.0),
+            rec_cache_config=config.get("rec_cache"),
+            engine_factory=cls.engine_factory_from_config(config),
+            max_wait_ms=config.get("batching", {}).get("max_wait_ms", 10),
+            warm=config.get("warm_up", True),
+            metrics=metrics,
+            profiles=merge_profiles(config.get("profiles")),
+            default_profile=config.get("profile", "accurate"),
+        )
+
+    def _spawn(self, index):
+        """启动工作进程并等待引擎就绪，返回 (进程, 管道)"""
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.engine_factory, self.profiles, self.default_profile, self.warm,
+                  self.rec_cache_config, index == 0, self.metrics.enabled),
+            name=f"ocr-worker-{index}",
+            daemon=True,
+        )
+        start = time.perf_counter()
+        process.start()
+        child_conn.close()
+        # 工作进程卡在创建引擎时不能一直等下去，超时按启动失败处理；进程退出时管道关闭，poll 立即返回
+        if not parent_conn.poll(self.startup_timeout):
+            process.terminate()
+            process.join()
+            parent_conn.close()
+            raise RuntimeError(f"OCR工作进程初始化失败: {self.startup_timeout:.0f} 秒内没有就绪")
+        try:
+            status, _, detail, _ = parent_conn.recv()
+        except EOFError:
+            process.join()
+            status, detail = "error", f"工作进程意外退出 (exitcode {process.exitcode})"
+        if status != "ready":
+            process.join()
+            parent_conn.close()
+            raise RuntimeError(f"OCR工作进程初始化失败: {detail}")
+        self.logger.info(f"OCR工作进程 {index} (pid {process.pid}) 就绪，"
+                         f"启动耗时 {(time.perf_counter() - start) * 1000:.0f} ms，其中创建引擎 {detail:.0f} ms")
+        return process, parent_conn
+
+    def _worker(self, index):
+        try:
+            process, conn = self._spawn(index)
+        except Exception as e:
+            self._init_error = e
+            self._ready.set()
+            return
+        slots = FrameSlots(self.slot_count)
+
+        with self._cond:
+            self._started += 1
+            if self._started == self.worker_count:
+                self._ready.set()
+
+        try:
+            while True:
+                jobs = self._collect()
+                if jobs is None:
+                    break
+                jobs = [job for _, job in jobs if job[2].set_running_or_notify_cancel()]
+                if not jobs:
+                    continue
+                try:
+                    # 每次最多发送槽位数个请求，槽位在结果返回之前不会被覆盖
+                    for start in range(0, len(jobs), self.slot_count):
+                        self._dispatch(conn, slots, jobs[start:start + self.slot_count])
+                except Exception as e:
+                    # 进程崩溃或没有响应：未完成的请求返回错误，重启进程
+                    for _, _, future in jobs:
+                        if not future.done():
+                            future.set_exception(RuntimeError(f"OCR工作进程异常: {type(e).__name__} {e}"))
+                    process, conn = self._restart(index, process, conn)
+                    if process is None:
+                        break
+        finally:
+            if process is not None:
+                self._terminate(process, conn)
+            slots.close()
+
+    def _dispatch(self, conn, slots, jobs):
+        """把一批请求写入槽位发给工作进程，再按顺序取回结果"""
+        pending = {}
+        for job_id, (img, kwargs, future) in enumerate(jobs):
+            index, slot = slots.acquire(_array_bytes(img))
+            desc, _ = pack(img, slot.buf)
+            conn.send((job_id, index, slot.name, desc, kwargs))
+            pending[job_id] = future
+        while pending:
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"{self.timeout:.0f} 秒内没有返回结果")
+            status, job_id, payload, stats = conn.recv()
+            if stats:
+                observations, counters = stats
+                for stage, seconds in observations:
+                    self.metrics.observe(stage, seconds)
+                for name, n in counters.items():
+                    self.metrics.inc(name, n)
+            future = pending.pop(job_id)
+            if status == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _restart(self, index, process, conn):
+        self._terminate(process, conn, graceful=False)
+        while self._running:
+            try:
+                self.restarts += 1
+                self.logger.warning(f"重启OCR工作进程 {index}（第 {self.restarts} 次）")
+                return self._spawn(index)
+            except Exception as e:
+                self.logger.error(str(e))
+                time.sleep(1.0)
+        return None, None
+
+    def _terminate(self, process, conn, graceful=True):
+        if graceful and process.is_alive():
+            try:
+                conn.send(None)
+                process.join(5.0)
+            except Exception:
+                pass
+        if process.is_alive():
+            process.kill()
+            process.join()
+        conn.close()
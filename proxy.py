@@ -0,0 +1,18 @@
+class EngineProxy:
+    """包装引擎内部的检测器/分类器/识别器的基类，子类只实现 __call__
+
+    其他属性的读写都转发给被包装的对象，例如批量推理设置的 rec_batch_num 要落到真正的识别器上；
+    以下划线开头的属性属于包装层本身。
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._target, name, value)
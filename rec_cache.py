@@ -0,0 +1,142 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from metrics import NullMetrics
+from proxy import EngineProxy
+
+# 识别结果缓存保存路径
+REC_CACHE_FILE = 'rec_cache.json'
+
+
+def crop_key(crop, height=32, levels=32):
+    """文本框小图的内容哈希：转灰度、缩放到固定高度、量化亮度后计算哈希
+
+    同一个按钮每轮截到的小图像素相同或只差一两个像素，规范化后得到相同的键。
+    """
+    gray = crop[..., :3].mean(axis=2) if crop.ndim == 3 else crop.astype(np.float32)
+    h, w = gray.shape[:2]
+    if h == 0 or w == 0:
+        return None
+    width = max(4, int(round(w * height / float(h) / 4)) * 4)
+    rows = np.arange(height) * h // height
+    cols = np.arange(width) * w // width
+    small = (gray[rows][:, cols] * (levels / 256.0)).astype(np.uint8)
+    return hashlib.blake2b(small.tobytes(), digest_size=16).hexdigest()
+
+
+class RecognitionCache:
+    """按小图内容缓存识别结果 (文本, 置信度)，容量满时淘汰最久未使用的项"""
+
+    def __init__(self, capacity=2048, path=REC_CACHE_FILE, min_confidence=0.8, metrics=None):
+        self.capacity = capacity
+        self.path = path
+        self.min_confidence = min_confidence  # 只缓存置信度足够高的结果
+        self.metrics = metrics or NullMetrics()
+        self.logger = logging.getLogger()
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    @classmethod
+    def from_config(cls, config, metrics=None):
+        return cls(
+            capacity=config.get("capacity", 2048),
+            path=config.get("path", REC_CACHE_FILE),
+            min_confidence=config.get("min_confidence", 0.8),
+            metrics=metrics,
+        )
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key) if key else None
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        self.metrics.inc("rec_cache_misses" if value is None else "rec_cache_hits")
+        return value
+
+    def put(self, key, text, confidence):
+        if not key or confidence < self.min_confidence:
+            return
+        with self._lock:
+            self._entries[key] = (text, float(confidence))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate(), 3),
+        }
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+            # 文件中按从旧到新的顺序保存
+            for key, text, confidence in items[-self.capacity:]:
+                self._entries[key] = (text, confidence)
+            self.logger.info(f"已加载识别结果缓存 {len(self._entries)} 项")
+        except Exception as e:
+            self.logger.error(f"读取识别结果缓存失败: {str(e)}")
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            items = [[key, text, confidence] for key, (text, confidence) in self._entries.items()]
+            self._dirty = False
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(items, f, ensure_ascii=False)
+        except Exception as e:
+            self.logger.error(f"保存识别结果缓存失败: {str(e)}")
+
+
+class CachedRecognizer(EngineProxy):
+    """放在引擎识别器前面：命中缓存的小图不再识别，其余的一起交给原识别器"""
+
+    def __init__(self, recognizer, cache):
+        super().__init__(recognizer)
+        self._cache = cache
+
+    def __call__(self, img_list):
+        keys = [crop_key(img) for img in img_list]
+        results = [self._cache.get(key) for key in keys]
+        missing = [i for i, value in enumerate(results) if value is None]
+        elapse = 0.0
+        if missing:
+            rec_res, elapse = self._target([img_list[i] for i in missing])
+            for i, (text, confidence) in zip(missing, rec_res):
+                results[i] = (text, confidence)
+                self._cache.put(keys[i], text, confidence)
+        return results, elapse
+
+
+def install_cache(engine, cache):
+    """让引擎的所有识别（整帧OCR、只识别模式、批量推理）都先查缓存"""
+    recognizer = getattr(engine, "text_recognizer", None)
+    if recognizer is not None and not isinstance(recognizer, CachedRecognizer):
+        engine.text_recognizer = CachedRecognizer(recognizer, cache)
+    return engine
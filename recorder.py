@@ -0,0 +1,197 @@
+import io
+import json
+import logging
+import mmap
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+from screen import CaptureBackend, CaptureFinished
+
+# 录制保存目录
+RECORD_DIR = 'recordings'
+INDEX_FILE = 'index.jsonl'
+
+
+def result_to_json(result):
+    """把OCR结果转换成可以写入JSON的结构"""
+    if not result or not result[0]:
+        return []
+    return [[[[float(p[0]), float(p[1])] for p in line[0]], [line[1][0], float(line[1][1])]]
+            for line in result[0]]
+
+
+def result_from_json(lines):
+    """还原成与 ocr.ocr 返回值相同的结构"""
+    if not lines:
+        return [None]
+    return [[[box, (text, confidence)] for box, (text, confidence) in lines]]
+
+
+class SessionRecorder:
+    """录制识别过程：每帧画面（PNG，按块写入）、时间戳、OCR结果、任务状态和点击
+
+    目录结构:
+        frames_000.bin, frames_001.bin ...  PNG帧首尾相接，每块最多 chunk_frames 帧
+        index.jsonl                         每帧一行，记录所在块、偏移、长度和识别信息
+    编码和写盘在后台线程完成，不占用识别线程的时间。
+    """
+
+    def __init__(self, root=RECORD_DIR, chunk_frames=200, compress_level=1, max_queue=32, color="RGB", name=""):
+        folder = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if name:
+            # 多个窗口同时录制时用窗口标题区分目录
+            folder += "_" + "".join(c if c.isalnum() else "_" for c in name)
+        self.path = os.path.join(root, folder)
+        os.makedirs(self.path, exist_ok=True)
+        self.chunk_frames = chunk_frames
+        self.compress_level = compress_level
+        self.color = color.upper()  # 传入帧的通道顺序，统一按RGB保存
+        self.logger = logging.getLogger()
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self._start = time.time()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+        self.logger.info(f"开始录制到: {self.path}")
+
+    @classmethod
+    def from_config(cls, config, color="RGB", name=""):
+        return cls(
+            root=config.get("path", RECORD_DIR),
+            chunk_frames=config.get("chunk_frames", 200),
+            compress_level=config.get("compress_level", 1),
+            color=color,
+            name=name,
+        )
+
+    def record(self, frame, timestamp, task, result, clicks=(), skipped=False, next_task=None):
+        """提交一帧，帧数据会被拷贝，截图缓冲区可以立即复用"""
+        event = {
+            "seq": self.frame_count,
+            "t": round(timestamp - self._start, 4),
+            "task": task,
+            "next_task": next_task or task,
+            "skipped": skipped,
+            "result": result_to_json(result),
+            "clicks": [list(c) for c in clicks],
+        }
+        self.frame_count += 1
+        if self.color == "BGR":
+            frame = frame[..., ::-1]
+        try:
+            self._queue.put_nowait((np.ascontiguousarray(frame).copy(), event))
+        except queue.Full:
+            # 磁盘跟不上时丢帧，不能拖慢识别
+            self.dropped_frames += 1
+
+    def _writer(self):
+        chunk_id = -1
+        chunk = None
+        written = 0
+        with open(os.path.join(self.path, INDEX_FILE), 'a', encoding='utf-8') as index:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                frame, event = item
+                try:
+                    if chunk is None or written >= self.chunk_frames:
+                        if chunk:
+                            chunk.close()
+                        chunk_id += 1
+                        written = 0
+                        chunk = open(os.path.join(self.path, f"frames_{chunk_id:03d}.bin"), 'ab')
+
+                    buf = io.BytesIO()
+                    Image.fromarray(frame).save(buf, format='PNG', compress_level=self.compress_level)
+                    data = buf.getvalue()
+                    event.update({
+                        "chunk": chunk_id,
+                        "offset": chunk.tell(),
+                        "length": len(data),
+                        "shape": list(frame.shape),
+                    })
+                    chunk.write(data)
+                    written += 1
+                    index.write(json.dumps(event, ensure_ascii=False) + "\n")
+                except Exception as e:
+                    self.logger.error(f"写入录制帧失败: {str(e)}")
+            if chunk:
+                chunk.close()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.logger.info(f"录制结束，共 {self.frame_count} 帧，丢弃 {self.dropped_frames} 帧: {self.path}")
+
+
+def load_index(path):
+    """读取录制目录的帧索引"""
+    with open(os.path.join(path, INDEX_FILE), 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayCaptureBackend(CaptureBackend):
+    """按录制的时间间隔（或以最快速度）回放录制的帧
+
+    帧数据块通过mmap读取，只在取帧时解码对应的PNG。
+    回放时由本后端控制节奏，识别循环不再额外等待。
+    """
+
+    paced = True
+
+    def __init__(self, path, color="RGB", realtime=True, loop=False):
+        super().__init__(color)
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.events = load_index(path)
+        if not self.events:
+            raise ValueError(f"录制目录中没有帧: {path}")
+        self.current_event = None
+        self._maps = {}
+        self._files = []
+        self._start = None
+
+    def _chunk(self, chunk_id):
+        if chunk_id not in self._maps:
+            f = open(os.path.join(self.path, f"frames_{chunk_id:03d}.bin"), 'rb')
+            self._files.append(f)
+            self._maps[chunk_id] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[chunk_id]
+
+    def capture(self):
+        index = self.frame_count
+        if index >= len(self.events):
+            if not self.loop:
+                raise CaptureFinished("录制已回放完毕")
+            index %= len(self.events)
+        event = self.events[index]
+
+        if self.realtime:
+            if self._start is None or index == 0:
+                self._start = time.perf_counter() - event["t"]
+            delay = self._start + event["t"] - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        data = self._chunk(event["chunk"])[event["offset"]:event["offset"] + event["length"]]
+        rgb = np.array(Image.open(io.BytesIO(data)).convert("RGB"))
+        self.current_event = event
+        self.frame_count += 1
+        return rgb[..., ::-1] if self.color == "BGR" else rgb
+
+    def close(self):
+        for m in self._maps.values():
+            m.close()
+        for f in self._files:
+            f.close()
+        self._maps = {}
+        self._files = []
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+# 学习到的区域保存路径
+ROI_FILE = 'roi_regions.json'
+
+
+def box_bounds(box):
+    """返回文本框四点坐标的外接矩形 (x0, y0, x1, y1)"""
+    xs = [p[0] for p in box]
+    ys = [p[1] for p in box]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def offset_result(result, dx, dy):
+    """把裁剪图上的OCR结果平移回整窗坐标，结构与 ocr.ocr 返回值一致"""
+    if not result or not result[0]:
+        return result
+    shifted = []
+    for line in result[0]:
+        box = [[p[0] + dx, p[1] + dy] for p in line[0]]
+        shifted.append([box, line[1]])
+    return [shifted]
+
+
+class RegionStore:
+    """按任务保存感兴趣区域(ROI)，可手动配置，也可根据目标出现过的位置自动学习
+
+    区域以窗口宽高的相对比例 [x0, y0, x1, y1] 保存，窗口尺寸变化后仍可使用。
+    """
+
+    def __init__(self, path=ROI_FILE, margin=0.05, configured=None):
+        self.path = path
+        self.margin = margin               # 学习时在目标框四周额外扩张的比例
+        self.configured = configured or {}  # 手动配置的区域，不参与学习
+        self.learned = {}
+        self.logger = logging.getLogger()
+        self.load()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            path=config.get("path", ROI_FILE),
+            margin=config.get("margin", 0.05),
+            configured=config.get("regions"),
+        )
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.learned = json.load(f)
+            self.logger.info(f"已加载ROI区域: {self.learned}")
+        except Exception as e:
+            self.logger.error(f"读取ROI区域失败: {str(e)}")
+
+    def save(self):
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.learned, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            self.logger.error(f"保存ROI区域失败: {str(e)}")
+
+    def get_crop(self, task, shape):
+        """返回任务区域在当前帧上的像素范围 (x0, y0, x1, y1)，没有区域时返回None"""
+        region = self.configured.get(task) or self.learned.get(task)
+        if not region:
+            return None
+        height, width = shape[:2]
+        x0 = max(0, int(region[0] * width))
+        y0 = max(0, int(region[1] * height))
+        x1 = min(width, int(np.ceil(region[2] * width)))
+        y1 = min(height, int(np.ceil(region[3] * height)))
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return None
+        return x0, y0, x1, y1
+
+    def learn(self, task, box, shape):
+        """把目标框并入任务区域，区域扩大时立即保存"""
+        if task in self.configured:
+            return False
+        height, width = shape[:2]
+        bx0, by0, bx1, by1 = box_bounds(box)
+        region = [
+            max(0.0, bx0 / width - self.margin),
+            max(0.0, by0 / height - self.margin),
+            min(1.0, bx1 / width + self.margin),
+            min(1.0, by1 / height + self.margin),
+        ]
+
+        old = self.learned.get(task)
+        if old:
+            if (bx0 / width >= old[0] and by0 / height >= old[1]
+                    and bx1 / width <= old[2] and by1 / height <= old[3]):
+                return False
+            region = [min(old[0], region[0]), min(old[1], region[1]),
+                      max(old[2], region[2]), max(old[3], region[3])]
+
+        self.learned[task] = [round(v, 4) for v in region]
+        self.logger.info(f"更新任务 '{task}' 的ROI区域: {self.learned[task]}")
+        self.save()
+        return True
@@ -0,0 +1,163 @@
+import collections
+import itertools
+import json
+
+import numpy as np
+
+# 任务流程配置文件
+TASKS_FILE = 'tasks.json'
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 多模式匹配自动机：扫描一遍文本即可找出所有出现的关键词"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for pattern, value in patterns:
+            self._insert(pattern, value)
+        self._build()
+
+    def _insert(self, pattern, value):
+        state = 0
+        for ch in pattern:
+            if ch not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+                self._goto[state][ch] = len(self._goto) - 1
+            state = self._goto[state][ch]
+        self._out[state].add(value)
+
+    def _build(self):
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def search(self, text):
+        """返回文本中出现的所有关键词对应的值"""
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            if self._out[state]:
+                found |= self._out[state]
+        return found
+
+
+def expand_keyword(keyword, confusions, limit=32):
+    """按易混淆字表展开关键词，例如 自动骰子 -> 自动骰子, 自动般子"""
+    options = [[ch] + list(confusions.get(ch, ())) for ch in keyword]
+    variants = []
+    for combo in itertools.product(*options):
+        variants.append("".join(combo))
+        if len(variants) >= limit:
+            break
+    return variants
+
+
+def box_centers(lines):
+    """一次计算所有文本框的中心点，返回 (n, 2) 数组"""
+    if not lines:
+        return np.zeros((0, 2), dtype=np.float32)
+    boxes = np.asarray([line[0] for line in lines], dtype=np.float32)
+    return boxes.reshape(len(lines), -1, 2).mean(axis=1)
+
+
+class Rule:
+    """一条目标规则：关键词、置信度阈值、动作和下一个状态"""
+
+    def __init__(self, config, defaults, confusions):
+        self.name = config["name"]
+        self.keywords = config.get("keywords", [self.name])
+        self.variants = []
+        for keyword in self.keywords:
+            self.variants.extend(expand_keyword(keyword, confusions))
+        self.match = config.get("match", "contains")   # contains 包含关键词 / exact 完全相同
+        self.min_confidence = config.get("min_confidence", defaults["min_confidence"])
+        self.action = config.get("action", "click")    # click 点击 / log 只记录
+        self.pick = config.get("pick", "first")        # 有多个匹配时: first / last / all
+        self.delay_after = config.get("delay_after", 0.0)
+        self.timing = config.get("timing")              # 覆盖默认点击时序，见 actions.DEFAULT_TIMING
+        self.verify = config.get("verify", True)        # 点击后确认界面变化，没有变化时重新点击
+        self.next = config.get("next")
+
+    def choose(self, hits):
+        if self.pick == "all":
+            return hits
+        if self.pick == "last":
+            return hits[-1:]
+        return hits[:1]
+
+
+class TaskState:
+    """编译后的任务状态：所有规则的关键词合并成一个自动机，每行文本只扫描一遍"""
+
+    def __init__(self, name, config, defaults, confusions):
+        self.name = name
+        self.interval = config.get("interval", defaults["interval"])
+        self.dump_text = config.get("dump_text", False)  # 是否把每一行识别结果写入日志
+        self.profile = config.get("profile", defaults["profile"])  # 引擎配置名，None 使用OCR服务的默认配置
+        self.rules = [Rule(rule, defaults, confusions) for rule in config.get("rules", [])]
+
+        patterns = []
+        self._exact = collections.defaultdict(set)
+        for index, rule in enumerate(self.rules):
+            for variant in rule.variants:
+                if rule.match == "exact":
+                    self._exact[variant].add(index)
+                else:
+                    patterns.append((variant, index))
+        self._automaton = KeywordAutomaton(patterns)
+
+    def match(self, lines):
+        """返回与规则一一对应的命中行号列表（已按置信度过滤）"""
+        hits = [[] for _ in self.rules]
+        for i, line in enumerate(lines):
+            text, confidence = line[1][0], line[1][1]
+            for index in self._automaton.search(text) | self._exact.get(text, set()):
+                if confidence > self.rules[index].min_confidence:
+                    hits[index].append(i)
+        return hits
+
+    def targets(self):
+        """需要点击的目标文本，用于ROI命中判断和区域学习"""
+        return [v for rule in self.rules if rule.action == "click" for v in rule.variants]
+
+
+class TaskFlow:
+    """从配置文件加载的任务流程"""
+
+    def __init__(self, config):
+        defaults = {
+            "min_confidence": config.get("min_confidence", 0.5),
+            "interval": config.get("interval", 2),
+            "profile": config.get("profile"),
+        }
+        confusions = config.get("confusions", {})
+        self.states = {name: TaskState(name, state, defaults, confusions)
+                       for name, state in config["states"].items()}
+        self.initial = config.get("initial") or next(iter(self.states))
+        for state in self.states.values():
+            for rule in state.rules:
+                if rule.next and rule.next not in self.states:
+                    raise ValueError(f"规则 '{rule.name}' 的下一个状态 '{rule.next}' 不存在")
+
+    def targets(self):
+        return {name: state.targets() for name, state in self.states.items()}
+
+
+def load_task_flow(path=TASKS_FILE):
+    """读取并编译任务流程配置"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return TaskFlow(json.load(f))
@@ -0,0 +1,224 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import socket
+import socketserver
+import threading
+
+from config import CONFIG_FILE, load_config
+from logging_setup import EventLog, setup_logger
+from metrics import create_metrics
+from ocr_service import create_ocr_service
+from session import AutomationSession
+
+
+class SessionManager:
+    """管理多个窗口会话和共享的OCR服务，界面、无界面运行器和控制接口都通过它操作
+
+    on_message(窗口, 消息) 和 on_change(窗口, 是否运行) 在会话线程中调用。
+    """
+
+    def __init__(self, config, on_message=None, on_change=None):
+        self.config = config
+        self.on_message = on_message
+        self.on_change = on_change
+        self.logger = logging.getLogger()
+        self.metrics = create_metrics(config["metrics"])
+        self.events = EventLog.from_config(config["logging"])
+        self.ocr_service = create_ocr_service(config["ocr_service"], self.metrics)
+        self.sessions = {}  # 窗口标题 -> 正在运行的会话
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def preload(self):
+        """加载并预热OCR引擎（阻塞直到完成）"""
+        self.ocr_service.start()
+
+    def start(self, titles):
+        """为每个窗口启动一个会话，已在运行的窗口跳过，返回新启动的窗口"""
+        started = []
+        for title in titles:
+            with self._lock:
+                if title in self.sessions:
+                    continue
+                session = AutomationSession(
+                    title, self.ocr_service, self.metrics, self.events, self.config,
+                    on_message=lambda message, title=title: self._message(title, message),
+                    on_finished=lambda title=title: self._finished(title),
+                )
+                thread = threading.Thread(target=session.run, name=f"session-{title}", daemon=True)
+                self.sessions[title] = session
+                self._threads[title] = thread
+            self.logger.info(f"开始识别窗口: {title}")
+            thread.start()
+            started.append(title)
+            if self.on_change:
+                self.on_change(title, True)
+        return started
+
+    def stop(self, titles=None):
+        """停止指定窗口（默认全部）的会话并等待结束，返回停止的窗口"""
+        with self._lock:
+            targets = [(title, self.sessions[title], self._threads.get(title)) for title in
+                       (self.sessions if titles is None else titles) if title in self.sessions]
+        for _, session, _ in targets:
+            session.stop()
+        for _, _, thread in targets:
+            if thread and thread is not threading.current_thread():
+                thread.join()
+        return [title for title, _, _ in targets]
+
+    def _message(self, title, message):
+        if self.on_message:
+            self.on_message(title, message)
+
+    def _finished(self, title):
+        with self._lock:
+            self.sessions.pop(title, None)
+            self._threads.pop(title, None)
+        if self.on_change:
+            self.on_change(title, False)
+
+    def status(self):
+        with self._lock:
+            sessions = list(self.sessions.values())
+        return {
+            "engine_ready": self.ocr_service.is_ready(),
+            "sessions": [session.status() for session in sessions],
+        }
+
+    def shutdown(self):
+        self.stop()
+        self.ocr_service.stop()
+        self.metrics.stop()
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.control.handle(json.loads(line.decode('utf-8')))
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+
+class ControlServer:
+    """本地控制接口：TCP连接上每行一个JSON命令，每行返回一个JSON结果
+
+    命令: {"cmd": "status"} / {"cmd": "start", "windows": [...]} / {"cmd": "stop", "windows": [...]}
+          {"cmd": "metrics"} / {"cmd": "preload"} / {"cmd": "shutdown"}
+    """
+
+    def __init__(self, manager, host="127.0.0.1", port=47800, on_shutdown=None):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.on_shutdown = on_shutdown
+        self.logger = logging.getLogger()
+        self._server = None
+
+    @classmethod
+    def from_config(cls, manager, config, on_shutdown=None):
+        return cls(manager, config.get("host", "127.0.0.1"), config.get("port", 47800), on_shutdown)
+
+    def handle(self, request):
+        command = request.get("cmd")
+        if command == "status":
+            return dict(ok=True, **self.manager.status())
+        if command in ("start", "stop"):
+            titles = request.get("windows", [] if command == "start" else None)
+            # 字符串也可以迭代，不检查的话 "微信" 会按字符启动多个会话
+            valid = isinstance(titles, list) and all(isinstance(title, str) for title in titles)
+            if not valid and not (command == "stop" and titles is None):
+                return {"ok": False, "error": "windows 必须是窗口标题的列表"}
+        if command == "start":
+            return {"ok": True, "started": self.manager.start(titles)}
+        if command == "stop":
+            # 在后台线程中等待会话结束，不阻塞控制连接；省略 windows 时停止所有会话
+            threading.Thread(target=self.manager.stop, args=(titles,), daemon=True).start()
+            return {"ok": True}
+        if command == "metrics":
+            return {"ok": True, "metrics": self.manager.metrics.snapshot()}
+        if command == "preload":
+            threading.Thread(target=self.manager.preload, daemon=True).start()
+            return {"ok": True}
+        if command == "shutdown":
+            if not self.on_shutdown:
+                return {"ok": False, "error": "当前进程不支持远程退出"}
+            threading.Thread(target=self.on_shutdown, daemon=True).start()
+            return {"ok": True}
+        return {"ok": False, "error": f"未知命令: {command}"}
+
+    def start(self):
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((self.host, self.port), _ControlHandler)
+        self._server.daemon_threads = True
+        self._server.control = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.logger.info(f"控制接口已启动: {self.host}:{self.port}")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def send_command(request, host="127.0.0.1", port=47800, timeout=10.0):
+    """向控制接口发送一条命令并返回结果"""
+    with socket.create_connection((host, port), timeout=timeout) as conn:
+        conn.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode('utf-8'))
+        with conn.makefile('rb') as reader:
+            return json.loads(reader.readline().decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面运行识别，可通过本地控制接口启动/停止/查询")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--windows", nargs="*", default=[], help="启动后立即开始识别的窗口标题")
+    parser.add_argument("--send", metavar="JSON", help="向正在运行的实例发送命令后退出，例如 '{\"cmd\": \"status\"}'")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    control_config = config["control"]
+    if args.send:
+        host, port = control_config.get("host", "127.0.0.1"), control_config.get("port", 47800)
+        print(json.dumps(send_command(json.loads(args.send), host, port), ensure_ascii=False, indent=2))
+        return
+
+    logger = setup_logger(config["logging"].get("queue_size", 10000))
+    logger.info("无界面模式启动")
+    done = threading.Event()
+    manager = SessionManager(config, on_message=lambda title, message: None)
+    manager.metrics.start()
+
+    server = None
+    if control_config.get("enabled", False):
+        server = ControlServer.from_config(manager, control_config, on_shutdown=done.set)
+        server.start()
+
+    try:
+        if config["ocr_service"].get("preload", True):
+            manager.preload()
+        manager.start(args.windows)
+        # 没有控制接口时所有会话结束即退出；有控制接口时等待 shutdown 命令
+        while not done.wait(1.0):
+            if server is None and not manager.sessions:
+                break
+    except KeyboardInterrupt:
+        logger.info("收到中断信号")
+    finally:
+        if server:
+            server.stop()
+        manager.shutdown()
+        logger.info("无界面模式退出")
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+import time
+
+# 学习到的状态耗时保存路径
+SCHEDULE_FILE = 'schedule_stats.json'
+
+
+class AdaptiveScheduler:
+    """自适应识别调度：学习每次状态切换后游戏进入下一步通常需要多久，据此决定识别间隔
+
+    - 还没有学习数据时使用任务配置中的固定间隔
+    - 离预期时间还远时只在进入密集窗口前醒来一次（最长 max_interval）
+    - 在预期时间附近按 dense_interval 密集识别
+    - 超过预期时间仍未命中时按 backoff 指数退避，最长 max_interval
+
+    截图线程读取 next_interval，识别线程调用 on_miss/on_transition/rollback，共享状态由锁保护。
+    """
+
+    def __init__(self, base_intervals, initial_state, min_interval=0.2, max_interval=5.0,
+                 dense_interval=0.3, dense_window=0.25, backoff=1.5, alpha=0.3, path=SCHEDULE_FILE):
+        self.base_intervals = base_intervals  # 状态 -> 配置的固定间隔
+        self.initial_state = initial_state    # 回到该状态表示完成一轮
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.dense_interval = dense_interval
+        self.dense_window = dense_window      # 密集识别窗口占预期耗时的比例
+        self.backoff = backoff
+        self.alpha = alpha                    # 指数移动平均系数
+        self.path = path
+        self.logger = logging.getLogger()
+        self.timings = {}                     # "上一状态->当前状态" -> {"mean", "min", "count"}
+        self.rounds = 0
+        self.round_seconds = []
+        self._key = None
+        self._entered = time.monotonic()
+        self._late_misses = 0
+        self._round_start = self._entered
+        self._session_start = self._entered
+        self._undo = None  # 最近一次状态切换之前的状态，点击失败回退时恢复
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def from_config(cls, config, base_intervals, initial_state):
+        return cls(
+            base_intervals,
+            initial_state,
+            min_interval=config.get("min_interval", 0.2),
+            max_interval=config.get("max_interval", 5.0),
+            dense_interval=config.get("dense_interval", 0.3),
+            dense_window=config.get("dense_window", 0.25),
+            backoff=config.get("backoff", 1.5),
+            alpha=config.get("alpha", 0.3),
+            path=config.get("path", SCHEDULE_FILE),
+        )
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.timings = json.load(f)
+        except Exception as e:
+            self.logger.error(f"读取调度统计失败: {str(e)}")
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.timings, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            self.logger.error(f"保存调度统计失败: {str(e)}")
+
+    def _clamp(self, seconds):
+        return min(self.max_interval, max(self.min_interval, seconds))
+
+    def next_interval(self, state):
+        """下一次识别前应等待的秒数"""
+        with self._lock:
+            timing = self.timings.get(self._key) if self._key else None
+            if not timing:
+                return self.base_intervals.get(state, self.max_interval)
+            expected = timing["mean"]
+            elapsed = time.monotonic() - self._entered
+            late_misses = self._late_misses
+
+        window = max(self.dense_interval * 2, expected * self.dense_window)
+        remaining = expected - elapsed
+        if remaining > window:
+            # 离预期时间还远：直接睡到密集窗口开始
+            return self._clamp(remaining - window)
+        if remaining >= -window:
+            return self._clamp(self.dense_interval)
+        # 超过预期仍未出现：指数退避
+        return self._clamp(self.dense_interval * self.backoff ** late_misses)
+
+    def on_miss(self):
+        """处理了一帧但没有发生状态切换"""
+        with self._lock:
+            timing = self.timings.get(self._key) if self._key else None
+            if timing and time.monotonic() - self._entered > timing["mean"]:
+                self._late_misses += 1
+
+    def on_transition(self, previous, state):
+        """状态切换：更新上一状态的耗时统计，开始计时新状态；完成一轮时返回本轮耗时"""
+        with self._lock:
+            now = time.monotonic()
+            timing = self.timings.get(self._key) if self._key else None
+            self._undo = (self._key, self._entered, self._late_misses, dict(timing) if timing else None,
+                          self._round_start, self.rounds, self.round_seconds)
+            if self._key:
+                elapsed = now - self._entered
+                if timing:
+                    timing["mean"] = round((1 - self.alpha) * timing["mean"] + self.alpha * elapsed, 3)
+                    timing["min"] = round(min(timing["min"], elapsed), 3)
+                    timing["count"] += 1
+                else:
+                    self.timings[self._key] = {"mean": round(elapsed, 3), "min": round(elapsed, 3), "count": 1}
+            self._key = f"{previous}->{state}"
+            self._entered = now
+            self._late_misses = 0
+
+            if state == self.initial_state:
+                round_time = now - self._round_start
+                self._round_start = now
+                self.rounds += 1
+                self.round_seconds = (self.round_seconds + [round_time])[-20:]
+                self.save()
+                return round_time
+            return None
+
+    def rollback(self):
+        """撤销最近一次状态切换（点击发送失败，界面其实没有切换），恢复耗时统计和计时"""
+        with self._lock:
+            if self._undo is None:
+                return
+            key, entered, late_misses, timing, round_start, rounds, round_seconds = self._undo
+            self._undo = None
+            if key:
+                if timing:
+                    self.timings[key] = timing
+                else:
+                    self.timings.pop(key, None)
+            self._key = key
+            self._entered = entered
+            self._late_misses = late_misses
+            self._round_start = round_start
+            self.rounds = rounds
+            self.round_seconds = round_seconds
+
+    def rounds_per_hour(self):
+        """按最近若干轮的平均耗时估算每小时轮数"""
+        seconds = self.round_seconds
+        if not seconds:
+            return 0.0
+        return 3600.0 / (sum(seconds) / len(seconds))
+
+    def stats(self):
+        with self._lock:
+            timings = {key: dict(timing) for key, timing in self.timings.items()}
+        return {
+            "timings": timings,
+            "rounds": self.rounds,
+            "rounds_per_hour": round(self.rounds_per_hour(), 1),
+            "uptime_hours": round((time.monotonic() - self._session_start) / 3600, 2),
+        }
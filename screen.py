@@ -1,78 +1,369 @@
-import win32gui
-import win32ui
-import win32con
-import win32api
-from PIL import Image
 import ctypes
+import glob
+import os
+import threading
+import time
 
-def capture_application_window(window_title):
-    # 获取窗口句柄
-    hwnd = win32gui.FindWindow(None, window_title)
-    if hwnd == 0:
-        raise ValueError(f"未找到窗口 '{window_title}'")
-
-    # 恢复窗口（如果最小化）
-    if win32gui.IsIconic(hwnd):
-        win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-        win32gui.UpdateWindow(hwnd)
-    
-    # 获取DPI缩放因子
+import numpy as np
+from PIL import Image
+
+try:
+    import win32gui
+    import win32con
+except ImportError:  # 非Windows环境下只能使用文件/合成截图后端
+    win32gui = None
+    win32con = None
+
+PW_RENDERFULLCONTENT = 3
+DIB_RGB_COLORS = 0
+SRCCOPY = 0x00CC0020
+
+
+class CaptureFinished(Exception):
+    """截图来源已经读完（文件/回放后端）"""
+
+
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [
+        ("biSize", ctypes.c_uint32),
+        ("biWidth", ctypes.c_int32),
+        ("biHeight", ctypes.c_int32),
+        ("biPlanes", ctypes.c_uint16),
+        ("biBitCount", ctypes.c_uint16),
+        ("biCompression", ctypes.c_uint32),
+        ("biSizeImage", ctypes.c_uint32),
+        ("biXPelsPerMeter", ctypes.c_int32),
+        ("biYPelsPerMeter", ctypes.c_int32),
+        ("biClrUsed", ctypes.c_uint32),
+        ("biClrImportant", ctypes.c_uint32),
+    ]
+
+
+class BITMAPINFO(ctypes.Structure):
+    _fields_ = [("bmiHeader", BITMAPINFOHEADER), ("bmiColors", ctypes.c_uint32 * 3)]
+
+
+_gdi_ready = False
+
+
+def _setup_gdi():
+    """声明用到的GDI函数签名，64位下句柄不能按默认的int截断"""
+    global _gdi_ready
+    if _gdi_ready:
+        return
+    from ctypes import wintypes
+    user32 = ctypes.windll.user32
+    gdi32 = ctypes.windll.gdi32
+
+    user32.GetWindowDC.restype = wintypes.HDC
+    user32.GetWindowDC.argtypes = [wintypes.HWND]
+    user32.ReleaseDC.argtypes = [wintypes.HWND, wintypes.HDC]
+    user32.PrintWindow.argtypes = [wintypes.HWND, wintypes.HDC, wintypes.UINT]
+    gdi32.CreateCompatibleDC.restype = wintypes.HDC
+    gdi32.CreateCompatibleDC.argtypes = [wintypes.HDC]
+    gdi32.CreateDIBSection.restype = wintypes.HBITMAP
+    gdi32.CreateDIBSection.argtypes = [wintypes.HDC, ctypes.c_void_p, wintypes.UINT,
+                                       ctypes.POINTER(ctypes.c_void_p), wintypes.HANDLE, wintypes.DWORD]
+    gdi32.SelectObject.restype = wintypes.HGDIOBJ
+    gdi32.SelectObject.argtypes = [wintypes.HDC, wintypes.HGDIOBJ]
+    gdi32.DeleteObject.argtypes = [wintypes.HGDIOBJ]
+    gdi32.DeleteDC.argtypes = [wintypes.HDC]
+    gdi32.BitBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                             wintypes.HDC, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
     try:
+        user32.SetProcessDPIAware()  # 设置DPI感知，整个进程只需一次
+    except Exception:
+        pass
+    _gdi_ready = True
+
+
+class CaptureBackend:
+    """截图后端接口：capture() 返回 (高, 宽, 3) 的 uint8 数组"""
+
+    paced = False  # 为True时由后端自己控制取帧节奏（回放），识别循环不再额外等待
+
+    def __init__(self, color="RGB"):
+        self.color = color.upper()
+        self.frame_count = 0
+
+    def capture(self):
+        raise NotImplementedError
+
+    def probe(self, x0, y0, x1, y1):
+        """截取一小块区域的拷贝，用于点击后快速确认界面变化；不支持时返回None"""
+        return None
+
+    def _as_color(self, bgra):
+        """从BGRA缓冲区取出 RGB/BGR 视图，不做拷贝"""
+        if self.color == "BGR":
+            return bgra[..., :3]
+        return bgra[..., 2::-1]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WindowCapturer(CaptureBackend):
+    """持续截取指定窗口
+
+    窗口句柄、DC 和 DIB 位图在多帧之间复用，只在窗口尺寸变化时重建。
+    每帧只做一次内存拷贝：从 DIB 位图拷到预先分配的环形缓冲区。
+    返回的是缓冲区视图，缓冲区数量决定了之前的帧在多少次截图之后会被覆盖。
+    """
+
+    PROBE_BLANK_LIMIT = 3  # 局部截图连续几次拷不到内容后改用 PrintWindow
+
+    def __init__(self, window_title, color="RGB", buffers=3):
+        super().__init__(color)
+        if win32gui is None:
+            raise RuntimeError("窗口截图只支持Windows")
+        _setup_gdi()
+        self.window_title = window_title
+        self.buffer_count = max(1, buffers)
+        self.hwnd = 0
+        self._hwnd_dc = None
+        self._mem_dc = None
+        self._bitmap = None
+        self._old_bitmap = None
+        self._dib = None
+        self._buffers = []
+        self._size = None
+        self._lock = threading.Lock()  # 点击确认在动作线程中截取局部，与截图线程共用DC和位图
+        self._probe_full = False       # 窗口DC拷贝不到内容（硬件加速窗口）时局部截图也用PrintWindow
+        self._blank_probes = 0         # 连续出现 BitBlt 全黑而 PrintWindow 有内容的次数
+
+    def _find_window(self):
+        if self.hwnd and win32gui.IsWindow(self.hwnd):
+            return self.hwnd
+        self._release()
+        self.hwnd = win32gui.FindWindow(None, self.window_title)
+        if self.hwnd == 0:
+            raise ValueError(f"未找到窗口 '{self.window_title}'")
+        return self.hwnd
+
+    def _allocate(self, width, height):
+        """为当前窗口尺寸创建DC、DIB位图和环形缓冲区"""
+        self._release_bitmap()
         user32 = ctypes.windll.user32
-        user32.SetProcessDPIAware()  # 设置DPI感知
-    except:
-        pass  # 如果失败，继续使用默认设置
-    
-    # 获取窗口位置和大小
-    left, top, right, bot = win32gui.GetWindowRect(hwnd)
-    width = right - left
-    height = bot - top
-    
-    # 使用PrintWindow方法截图
-    hwndDC = win32gui.GetWindowDC(hwnd)
-    if hwndDC == 0:
-        raise ValueError("无法获取窗口DC")
-    
-    try:
-        mfcDC = win32ui.CreateDCFromHandle(hwndDC)
-        saveDC = mfcDC.CreateCompatibleDC()
-        
-        # 创建位图
-        saveBitMap = win32ui.CreateBitmap()
-        saveBitMap.CreateCompatibleBitmap(mfcDC, width, height)
-        saveDC.SelectObject(saveBitMap)
-        
-        # 使用PrintWindow截图，这对分层窗口更有效
-        result = ctypes.windll.user32.PrintWindow(hwnd, saveDC.GetSafeHdc(), 3)  # PW_RENDERFULLCONTENT = 3
-        
-        # 如果PrintWindow失败，尝试使用BitBlt
-        if not result:
-            saveDC.BitBlt((0, 0), (width, height), mfcDC, (0, 0), win32con.SRCCOPY)
-        
-        # 转换为PIL图像
-        bmpinfo = saveBitMap.GetInfo()
-        bmpstr = saveBitMap.GetBitmapBits(True)
-        image = Image.frombuffer(
-            "RGB",
-            (bmpinfo["bmWidth"], bmpinfo["bmHeight"]),
-            bmpstr, "raw", "BGRX", 0, 1
-        )
-        
-        # 释放资源（严格按顺序）
-        win32gui.DeleteObject(saveBitMap.GetHandle())
-        saveDC.DeleteDC()
-        mfcDC.DeleteDC()
-        win32gui.ReleaseDC(hwnd, hwndDC)
-        
-        return image
-    
-    except Exception as e:
-        # 确保资源被释放
-        try:
-            win32gui.ReleaseDC(hwnd, hwndDC)
-            mfcDC.DeleteDC()
-            saveDC.DeleteDC()
-        except:
-            pass
-        raise ValueError(f"截图过程中发生错误: {str(e)}")
+        gdi32 = ctypes.windll.gdi32
+
+        if not self._hwnd_dc:
+            self._hwnd_dc = user32.GetWindowDC(self.hwnd)
+            if not self._hwnd_dc:
+                raise ValueError("无法获取窗口DC")
+        self._mem_dc = gdi32.CreateCompatibleDC(self._hwnd_dc)
+
+        bmi = BITMAPINFO()
+        bmi.bmiHeader.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+        bmi.bmiHeader.biWidth = width
+        bmi.bmiHeader.biHeight = -height  # 负数表示自上而下的行顺序
+        bmi.bmiHeader.biPlanes = 1
+        bmi.bmiHeader.biBitCount = 32
+        bits = ctypes.c_void_p()
+        self._bitmap = gdi32.CreateDIBSection(self._mem_dc, ctypes.byref(bmi), DIB_RGB_COLORS,
+                                              ctypes.byref(bits), None, 0)
+        if not self._bitmap:
+            raise ValueError("无法创建位图")
+        self._old_bitmap = gdi32.SelectObject(self._mem_dc, self._bitmap)
+
+        self._dib = np.ctypeslib.as_array(
+            ctypes.cast(bits, ctypes.POINTER(ctypes.c_uint8)), shape=(height, width, 4))
+        self._buffers = [np.empty((height, width, 4), dtype=np.uint8) for _ in range(self.buffer_count)]
+        self._size = (width, height)
+
+    def _prepare(self):
+        """找到窗口并确保DC和位图与窗口尺寸一致，返回 (句柄, 宽, 高)"""
+        hwnd = self._find_window()
+
+        # 恢复窗口（如果最小化）
+        if win32gui.IsIconic(hwnd):
+            win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
+            win32gui.UpdateWindow(hwnd)
+
+        left, top, right, bot = win32gui.GetWindowRect(hwnd)
+        width, height = right - left, bot - top
+        if width <= 0 or height <= 0:
+            raise ValueError(f"窗口尺寸无效: {width}x{height}")
+        if self._size != (width, height):
+            self._allocate(width, height)
+        return hwnd, width, height
+
+    def _grab(self):
+        """把整个窗口画到DIB位图中"""
+        hwnd, width, height = self._prepare()
+        user32 = ctypes.windll.user32
+        gdi32 = ctypes.windll.gdi32
+        # 使用PrintWindow截图，这对分层窗口更有效；失败时尝试BitBlt
+        if not user32.PrintWindow(hwnd, self._mem_dc, PW_RENDERFULLCONTENT):
+            gdi32.BitBlt(self._mem_dc, 0, 0, width, height, self._hwnd_dc, 0, 0, SRCCOPY)
+        gdi32.GdiFlush()
+
+    def capture(self):
+        with self._lock:
+            self._grab()
+            buffer = self._buffers[self.frame_count % self.buffer_count]
+            np.copyto(buffer, self._dib)
+            self.frame_count += 1
+        return self._as_color(buffer)
+
+    def probe(self, x0, y0, x1, y1):
+        """只截取指定区域，不占用环形缓冲区，之前截取的帧不会被覆盖
+
+        点击确认时每隔几十毫秒调用一次，只从窗口DC按区域大小 BitBlt 到DIB位图的相同位置，
+        不重绘整个窗口。拷贝出来全黑时用 PrintWindow 对照：画面本来就是黑的则照常使用，
+        连续 PROBE_BLANK_LIMIT 次 PrintWindow 有内容（硬件加速的窗口）才改为每次 PrintWindow 整个窗口。
+        """
+        with self._lock:
+            if self._probe_full:
+                self._grab()
+                return np.array(self._as_color(self._dib[max(0, y0):y1, max(0, x0):x1]))
+            _, width, height = self._prepare()
+            x0, y0 = max(0, x0), max(0, y0)
+            x1, y1 = min(width, x1), min(height, y1)
+            if x1 <= x0 or y1 <= y0:
+                return None
+            gdi32 = ctypes.windll.gdi32
+            ok = gdi32.BitBlt(self._mem_dc, x0, y0, x1 - x0, y1 - y0, self._hwnd_dc, x0, y0, SRCCOPY)
+            gdi32.GdiFlush()
+            region = self._dib[y0:y1, x0:x1]
+            if not ok:
+                self._probe_full = True
+                self._grab()
+            elif not region[..., :3].any():
+                self._grab()
+                if region[..., :3].any():
+                    self._blank_probes += 1
+                    if self._blank_probes >= self.PROBE_BLANK_LIMIT:
+                        self._probe_full = True
+            else:
+                self._blank_probes = 0
+            return np.array(self._as_color(region))
+
+    def _release_bitmap(self):
+        gdi32 = ctypes.windll.gdi32
+        if self._mem_dc:
+            if self._old_bitmap:
+                gdi32.SelectObject(self._mem_dc, self._old_bitmap)
+            gdi32.DeleteDC(self._mem_dc)
+        if self._bitmap:
+            gdi32.DeleteObject(self._bitmap)
+        self._mem_dc = None
+        self._bitmap = None
+        self._old_bitmap = None
+        self._dib = None
+        self._size = None
+
+    def _release(self):
+        """释放所有GDI资源（严格按顺序）"""
+        self._release_bitmap()
+        if self._hwnd_dc:
+            ctypes.windll.user32.ReleaseDC(self.hwnd, self._hwnd_dc)
+        self._hwnd_dc = None
+
+    def close(self):
+        self._release()
+        self.hwnd = 0
+
+
+class FileCaptureBackend(CaptureBackend):
+    """从图片文件循环读取帧，用于在没有游戏窗口的机器上调试和测试性能"""
+
+    def __init__(self, path, color="RGB", loop=True):
+        super().__init__(color)
+        if os.path.isdir(path):
+            files = []
+            for pattern in ("*.png", "*.jpg", "*.jpeg", "*.bmp"):
+                files.extend(glob.glob(os.path.join(path, pattern)))
+            files.sort()
+        else:
+            files = [path]
+        if not files:
+            raise ValueError(f"目录中没有图片: {path}")
+        self.loop = loop
+        # 预先解码成BGRA，之后每帧直接返回视图
+        self._frames = [np.array(Image.open(f).convert("RGBA"))[..., [2, 1, 0, 3]] for f in files]
+
+    def capture(self):
+        if self.frame_count >= len(self._frames) and not self.loop:
+            raise CaptureFinished("图片已全部读取")
+        frame = self._frames[self.frame_count % len(self._frames)]
+        self.frame_count += 1
+        return self._as_color(frame)
+
+
+class SyntheticCaptureBackend(CaptureBackend):
+    """生成合成画面：静态背景上有一个周期性出现的亮块，用于测试截图和变化检测的开销"""
+
+    def __init__(self, width=1280, height=720, color="RGB", change_every=10, seed=0):
+        super().__init__(color)
+        rng = np.random.default_rng(seed)
+        self._background = rng.integers(0, 64, size=(height, width, 4), dtype=np.uint8)
+        self._frame = self._background.copy()
+        self.change_every = max(1, change_every)
+
+    def capture(self):
+        phase = self.frame_count // self.change_every
+        if self.frame_count % self.change_every == 0:
+            height, width = self._frame.shape[:2]
+            np.copyto(self._frame, self._background)
+            if phase % 2:
+                self._frame[height // 2:height // 2 + 60, width // 3:width // 3 + 200, :3] = 255
+        self.frame_count += 1
+        return self._as_color(self._frame)
+
+    def probe(self, x0, y0, x1, y1):
+        return np.array(self._as_color(self._frame[max(0, y0):y1, max(0, x0):x1]))
+
+
+def create_capture_backend(window_title, config=None):
+    """根据配置创建截图后端"""
+    config = config or {}
+    backend = config.get("backend", "window")
+    color = config.get("color", "RGB")
+    if backend == "file":
+        return FileCaptureBackend(config["path"], color=color, loop=config.get("loop", True))
+    if backend == "replay":
+        from recorder import ReplayCaptureBackend
+        return ReplayCaptureBackend(config["path"], color=color, realtime=config.get("realtime", True),
+                                    loop=config.get("loop", False))
+    if backend == "synthetic":
+        width, height = config.get("size", (1280, 720))
+        return SyntheticCaptureBackend(width, height, color=color)
+    return WindowCapturer(window_title, color=color, buffers=config.get("buffers", 3))
+
+
+def capture_application_window(window_title):
+    """截取一次窗口并返回PIL图像（单次调用，循环中请使用 WindowCapturer）"""
+    with WindowCapturer(window_title) as capturer:
+        return Image.fromarray(np.ascontiguousarray(capturer.capture()))
+
+
+def benchmark(backend, frames=200):
+    """测量截图后端每帧耗时，返回 (平均毫秒, 帧率)"""
+    start = time.perf_counter()
+    for _ in range(frames):
+        backend.capture()
+    elapsed = time.perf_counter() - start
+    return elapsed / frames * 1000, frames / elapsed
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="截图后端性能测试")
+    parser.add_argument("--backend", default="synthetic", choices=["window", "file", "synthetic", "replay"])
+    parser.add_argument("--window", default="", help="窗口标题（window后端）")
+    parser.add_argument("--path", default="", help="图片文件或目录（file后端）、录制目录（replay后端）")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
 
+    bench_config = {"backend": args.backend, "path": args.path, "realtime": False}
+    with create_capture_backend(args.window, bench_config) as capture_backend:
+        ms, fps = benchmark(capture_backend, args.frames)
+    print(f"{args.backend}: 每帧 {ms:.2f} ms, {fps:.1f} 帧/秒")
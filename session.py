@@ -0,0 +1,470 @@
+import collections
+import logging
+import time
+
+import numpy as np
+
+from actions import create_input_backend
+from config import load_config
+from frame_diff import FrameChangeDetector, compute_fingerprint
+from layout_cache import LayoutCache
+from logging_setup import DumpLimiter, EventLog
+from metrics import NullMetrics
+from pipeline import Frame, FramePipeline
+from preprocess import PreprocessProfiles, Preprocessor
+from recorder import SessionRecorder
+from roi import RegionStore, offset_result
+from rules import box_centers, load_task_flow
+from scheduler import AdaptiveScheduler
+from screen import create_capture_backend
+from templates import TemplateMatcher
+from tiling import Tiler
+from verify import ClickVerifier
+
+
+class AutomationSession:
+    """一个窗口的自动化会话：截图 → OCR → 任务处理 → 点击，不依赖Qt
+
+    界面和无界面运行器都通过它运行识别；on_message 接收要显示给用户的消息，
+    on_finished 在会话结束时调用（都在会话的线程中调用）。
+    """
+
+    def __init__(self, window_title, ocr_service, metrics=None, events=None, config=None,
+                 on_message=None, on_finished=None):
+        self.window_title = window_title
+        self.ocr_service = ocr_service  # 多个窗口共享的OCR引擎服务
+        self.metrics = metrics or NullMetrics()  # 各阶段耗时和计数，关闭时为空操作
+        self.events = events or EventLog()       # 结构化事件日志，未配置路径时为空操作
+        self.is_running = True
+        self.logger = logging.getLogger()
+        self.last_click_time = 0  # 记录上次点击时间
+        self.config = config or load_config()
+        self.on_message = on_message
+        self.on_finished = on_finished
+        self.started_at = None
+        self.messages = collections.deque(maxlen=20)  # 最近的消息，供状态查询
+        self.dump_limiter = DumpLimiter.from_config(self.config["logging"])
+        
+        # 非真实窗口（文件、合成画面、回放）时只记录点击，不操作鼠标
+        self.dry_run = self.config["capture"].get("backend", "window") != "window"
+        self.frame_clicks = []   # 当前帧发出的点击，供录制使用
+        self.failed_click_state = None  # 点击发送失败时发出点击的任务状态，由识别线程回退
+        self.input = create_input_backend(window_title, self.config["input"], self.dry_run)
+        self.pipeline = None
+        self.verifier = None  # 点击后确认界面变化，截图后端创建后才能设置
+        
+        # 画面变化检测，画面未变化时复用上一次的OCR结果
+        frame_diff_config = self.config["frame_diff"]
+        self.change_detector = None
+        if frame_diff_config.get("enabled", True):
+            self.change_detector = FrameChangeDetector.from_config(frame_diff_config)
+        self.last_result = None
+        
+        # 任务感兴趣区域，只识别目标通常出现的位置
+        roi_config = self.config["roi"]
+        self.roi_store = None
+        if roi_config.get("enabled", True):
+            self.roi_store = RegionStore.from_config(roi_config)
+        self.roi_full_frame_every = max(1, roi_config.get("full_frame_every", 3))
+        self.roi_misses = 0
+        
+        # 文本框布局缓存，布局稳定时只做识别不做检测
+        layout_config = self.config["layout_cache"]
+        self.layout_cache = None
+        if layout_config.get("enabled", True):
+            self.layout_cache = LayoutCache.from_config(layout_config)
+        
+        # OCR前的预处理（缩放、灰度、裁边），按窗口分辨率选择参数
+        self.preprocess_profiles = PreprocessProfiles.from_config(self.config["preprocess"])
+        self.preprocessor = Preprocessor()
+        
+        # 大窗口分块并行识别
+        tiling_config = self.config["tiling"]
+        self.tiler = None
+        if tiling_config.get("enabled", False):
+            self.tiler = Tiler.from_config(tiling_config)
+        
+        # 已知按钮的模板匹配，命中时跳过OCR
+        template_config = self.config["templates"]
+        self.templates = None
+        if template_config.get("enabled", True):
+            self.templates = TemplateMatcher.from_config(template_config)
+        
+        # 任务流程（状态、目标文本、阈值、动作）从配置文件加载
+        self.flow = load_task_flow(self.config["tasks"].get("path", "tasks.json"))
+        self.current_task = self.flow.initial
+        self.recognition_interval = self.flow.states[self.current_task].interval
+        
+        # 各任务要点击的目标文本，用于判断ROI是否命中以及学习区域
+        self.task_targets = self.flow.targets()
+        
+        # 自适应识别调度，关闭时使用任务配置中的固定间隔
+        scheduler_config = self.config["scheduler"]
+        self.scheduler = None
+        if scheduler_config.get("enabled", True):
+            base_intervals = {name: state.interval for name, state in self.flow.states.items()}
+            self.scheduler = AdaptiveScheduler.from_config(scheduler_config, base_intervals, self.flow.initial)
+
+    def click_at_position(self, x, y, delay_after=0.0, timing=None, box=None, verify=True):
+        """提交一次点击给动作线程执行，delay_after 为点击后界面响应所需的等待时间
+
+        开启点击确认时 delay_after 只是等待界面变化的上限，界面一有反应就继续。
+        点击是异步执行的，返回True只表示已提交；发送失败时由 send_click 记录，
+        下一帧识别前回退到发出点击时的任务状态。
+        """
+        self.frame_clicks.append((float(x), float(y)))
+        state = self.current_task
+        # 同一位置的点击还没执行完时合并成一次
+        key = (int(x) // 8, int(y) // 8)
+        if self.verifier and verify:
+            region = self.verifier.region(x, y, box)
+            self.pipeline.submit_action(lambda: self.verified_click(x, y, timing, region, delay_after, state),
+                                        0.0, key)
+        else:
+            self.pipeline.submit_action(lambda: self.send_click(x, y, timing, state), delay_after, key)
+        return True
+
+    def verified_click(self, x, y, timing, region, delay_after, state=None):
+        """点击并等待目标区域变化，没有变化时立即重新点击（在动作线程中执行）"""
+        verified = self.verifier.click(lambda: self.send_click(x, y, timing, state), region, delay_after)
+        if verified is None and delay_after > 0:
+            time.sleep(delay_after)  # 无法截取区域时按固定时间等待
+        elif verified is False:
+            self.logger.warning(f"点击 ({x:.0f}, {y:.0f}) 后界面没有变化")
+            self.notify("点击后界面没有变化")
+
+    def send_click(self, x, y, timing=None, state=None):
+        """通过输入后端发送点击（在动作线程中执行），失败时记录发出点击的任务状态"""
+        # 点击后画面即将变化，下一帧必须重新识别
+        if self.change_detector:
+            self.change_detector.reset()
+        try:
+            with self.metrics.timer("click"):
+                self.input.click(x, y, timing)
+            self.last_click_time = time.time()
+            self.metrics.inc("clicks")
+            return True
+        except Exception as e:
+            self.metrics.inc("errors")
+            self.logger.error(f"点击操作失败: {str(e)}")
+            if state is not None and self.failed_click_state is None:
+                self.failed_click_state = state
+            return False
+
+    def revert_failed_click(self):
+        """点击发送失败时回退到发出点击时的任务状态，并强制下一次重新OCR（在识别线程中执行）
+
+        识别线程提交点击后立即切换了状态，点击失败时界面其实还停在原来的状态。
+        流水线会丢弃点击完成前截取的帧，所以到这里时动作线程已经执行完这次点击。
+        """
+        state = self.failed_click_state
+        if state is None:
+            return
+        self.failed_click_state = None
+        self.last_result = None
+        if self.change_detector:
+            self.change_detector.reset()
+        if state != self.current_task:
+            self.logger.warning(f"点击发送失败，从{self.current_task}任务回退到{state}任务")
+            self.notify(f"点击发送失败，回退到{state}任务")
+            self.events.emit("transition", window=self.window_title, rule="click_failed",
+                             previous=self.current_task, state=state)
+            self.current_task = state
+            self.recognition_interval = self.flow.states[state].interval
+            # 调度器也回到切换之前，下一次识别间隔不按没有发生的切换计算
+            if self.scheduler:
+                self.scheduler.rollback()
+
+    def target_lines(self, result):
+        """返回识别结果中属于当前任务目标文本的行"""
+        if not result or not result[0]:
+            return []
+        targets = self.task_targets.get(self.current_task, [])
+        return [line for line in result[0] if any(t in line[1][0] for t in targets)]
+
+    def target_boxes(self, result):
+        """返回识别结果中属于当前任务目标文本的文本框"""
+        return [line[0] for line in self.target_lines(result)]
+
+    def run_ocr(self, ocr, img, origin=(0, 0)):
+        """按当前分辨率的参数预处理后做OCR，结果换算回原图坐标"""
+        preprocessor = self.preprocessor
+        result = self.detect_and_recognize(ocr, preprocessor.apply(img), origin, preprocessor.ocr_kwargs())
+        return preprocessor.restore(result)
+
+    def detect_and_recognize(self, ocr, img, origin=(0, 0), kwargs=None):
+        """对图像做OCR；布局稳定时只识别缓存的文本框，跳过文本检测"""
+        kwargs = kwargs or {}
+        if self.layout_cache is None:
+            return self.detect(ocr, img, kwargs)
+        
+        key = (self.current_task, origin[0], origin[1]) + img.shape[:2]
+        fingerprint = compute_fingerprint(img)
+        entry = self.layout_cache.lookup(key, fingerprint)
+        if entry is not None:
+            result = self.layout_cache.recognize(ocr, img, key, entry)
+            if result is not None:
+                self.logger.info(f"复用缓存文本框，仅识别 {len(entry['boxes'])} 个区域")
+                return result
+            self.logger.info("缓存文本框识别置信度下降，重新检测")
+        
+        result = self.detect(ocr, img, kwargs)
+        self.layout_cache.store(key, result, fingerprint)
+        return result
+
+    def detect(self, ocr, img, kwargs):
+        """完整的检测+识别；开启分块时大图切成重叠的分块并行识别"""
+        if self.tiler and self.tiler.applies(img.shape):
+            return self.tiler.ocr(ocr, img, **kwargs)
+        return ocr.ocr(img, **kwargs)
+
+    def recognize(self, ocr, img_array):
+        """识别一帧：先用已知按钮的模板匹配，匹配不到时再做OCR"""
+        if self.templates is None:
+            return self.recognize_regions(ocr, img_array)
+        
+        key = (self.current_task,) + img_array.shape[:2]
+        with self.metrics.timer("template"):
+            matched = self.templates.match(key, img_array)
+        if self.templates.use_fast_path(matched):
+            self.logger.info(f"模板匹配到 {len(matched[0])} 个目标，跳过OCR")
+            self.metrics.inc("template_hits")
+            return matched
+        
+        result = self.recognize_regions(ocr, img_array)
+        self.templates.update(key, self.target_lines(result), img_array)
+        return result
+
+    def recognize_regions(self, ocr, img_array):
+        """OCR识别一帧：优先只识别当前任务的ROI区域，未命中时回退到整帧识别"""
+        self.preprocessor = self.preprocess_profiles.for_shape(img_array.shape)
+        crop = self.roi_store.get_crop(self.current_task, img_array.shape) if self.roi_store else None
+        if crop:
+            x0, y0, x1, y1 = crop
+            self.logger.info(f"识别ROI区域: ({x0}, {y0}, {x1}, {y1})")
+            roi_img = np.ascontiguousarray(img_array[y0:y1, x0:x1])
+            result = offset_result(self.run_ocr(ocr, roi_img, (x0, y0)), x0, y0)
+            if self.target_boxes(result):
+                self.roi_misses = 0
+                return result
+            
+            # 连续未命中时按间隔回退整帧识别，避免空闲等待时每帧都做两次识别
+            self.roi_misses += 1
+            if self.roi_misses % self.roi_full_frame_every != 0:
+                # 只识别了ROI的结果不能被画面未变化的帧复用，否则静止画面上不会再识别，也就不会回退整帧
+                if self.change_detector:
+                    self.change_detector.reset()
+                return result
+            self.logger.info("ROI区域未命中，回退到整帧识别")
+        
+        # 整帧识别时先裁掉不含目标的窗口边缘
+        frame, (mx, my) = self.preprocessor.crop_margins(img_array)
+        result = self.run_ocr(ocr, frame, (mx, my))
+        if mx or my:
+            result = offset_result(result, mx, my)
+        if self.roi_store:
+            for box in self.target_boxes(result):
+                self.roi_store.learn(self.current_task, box, img_array.shape)
+        return result
+
+    def handle_task(self, result):
+        """按任务流程配置处理识别结果，发生状态切换时返回True"""
+        state = self.flow.states[self.current_task]
+        lines = result[0]
+        
+        if state.dump_text:
+            # 逐行输出按时间限速，避免每帧写入大量日志
+            dumped = self.dump_limiter.select(lines)
+            for line in dumped:
+                self.logger.info(f"识别到文本: {line[1][0]} (置信度: {line[1][1]:.2f})")
+            if dumped and len(dumped) < len(lines):
+                self.logger.info(f"省略其余 {len(lines) - len(dumped)} 行识别文本")
+        
+        hits = state.match(lines)
+        centers = box_centers(lines)
+        for rule, rule_hits in zip(state.rules, hits):
+            if not rule_hits:
+                continue
+            for i in rule.choose(rule_hits):
+                text, confidence = lines[i][1][0], lines[i][1][1]
+                self.logger.info(f"识别到目标文本: {text} (置信度: {confidence:.2f})")
+                self.notify(f"识别到目标文本: {text} (置信度: {confidence:.2f})")
+                
+                if rule.action == "click":
+                    center_x, center_y = float(centers[i][0]), float(centers[i][1])
+                    if self.click_at_position(center_x, center_y, rule.delay_after, rule.timing,
+                                              lines[i][0], rule.verify):
+                        self.logger.info(f"已点击'{rule.name}'位置: ({center_x:.0f}, {center_y:.0f})")
+                        self.notify(f"已点击'{rule.name}'位置")
+            
+            # 命中带有下一个状态的规则时切换任务，本帧不再处理后面的规则
+            if rule.next:
+                previous = self.current_task
+                self.current_task = rule.next
+                self.recognition_interval = self.flow.states[rule.next].interval
+                self.logger.info(f"切换到{rule.next}任务")
+                self.metrics.inc("transitions")
+                self.events.emit("transition", window=self.window_title, rule=rule.name,
+                                 previous=previous, state=rule.next)
+                if self.scheduler:
+                    round_time = self.scheduler.on_transition(previous, rule.next)
+                    if round_time is not None:
+                        self.metrics.set_gauge("rounds_per_hour", round(self.scheduler.rounds_per_hour(), 1),
+                                               self.window_title)
+                        message = (f"完成本轮任务，耗时 {round_time:.1f} 秒，"
+                                   f"约每小时 {self.scheduler.rounds_per_hour():.1f} 轮")
+                        self.logger.info(message)
+                        self.notify(message)
+                return True
+        return False
+
+    def next_interval(self):
+        """下一次截图前的等待时间"""
+        if self.scheduler:
+            return self.scheduler.next_interval(self.current_task)
+        return self.recognition_interval
+
+    def notify(self, message):
+        self.messages.append(message)
+        if self.on_message:
+            self.on_message(message)
+
+    def report_error(self, message):
+        self.metrics.inc("errors")
+        self.logger.error(message)
+        self.notify(message)
+
+    def capture_frame(self, capturer, epoch):
+        """截图（在截图线程中执行）"""
+        self.logger.info(f"正在截取窗口 '{self.window_title}' 的截图")
+        with self.metrics.timer("capture"):
+            img_array = capturer.capture()
+        return Frame(0, epoch, img_array, time.time())
+
+    def process_frame(self, ocr, frame, recorder=None):
+        """识别一帧并交给当前任务处理（在识别线程中执行）"""
+        self.revert_failed_click()
+        frame_task = self.current_task
+        self.frame_clicks = []
+        self.metrics.inc("frames")
+
+        # 画面变化检测在识别线程中做：截图线程的帧可能在队列中被丢弃，
+        # 参考帧只能是真正被识别过的帧，否则带着变化的帧被丢弃后新画面会一直被当作未变化
+        with self.metrics.timer("convert"):
+            frame.changed = self.change_detector is None or self.change_detector.has_changed(frame.image)
+
+        # 画面未变化时跳过OCR，复用上一次的结果
+        skipped = not frame.changed and self.last_result is not None
+        if skipped:
+            result = self.last_result
+            self.metrics.inc("skipped_frames")
+            self.logger.info(f"画面未变化，跳过OCR (差异: {self.change_detector.last_diff:.2f}, "
+                             f"已跳过 {self.change_detector.skipped_frames} 帧)")
+        else:
+            # OCR识别
+            self.logger.info("开始OCR识别")
+            # 按任务状态选择引擎配置，例如空闲等待时用更快的配置
+            ocr.profile = self.flow.states[frame_task].profile
+            with self.metrics.timer("ocr"):
+                result = self.recognize(ocr, frame.image)
+            self.last_result = result
+
+        if result and result[0]:
+            text_count = len(result[0])
+            self.logger.info(f"识别到 {text_count} 个文本区域")
+            self.logger.info(f"当前任务状态: {self.current_task}")
+            
+            # 根据当前任务状态处理识别结果
+            with self.metrics.timer("match"):
+                switched = self.handle_task(result)
+        else:
+            self.logger.info("未识别到任何文本")
+            switched = False
+        
+        if not switched and self.scheduler:
+            self.scheduler.on_miss()
+
+        if recorder:
+            recorder.record(frame.image, frame.timestamp, frame_task, result, self.frame_clicks,
+                            skipped, self.current_task)
+        self.events.emit("frame", window=self.window_title, seq=frame.seq, task=frame_task,
+                         skipped=skipped, lines=len(result[0]) if result and result[0] else 0,
+                         clicks=self.frame_clicks)
+
+    def run(self):
+        self.started_at = time.time()
+        try:
+            # 共享OCR服务只在第一个窗口开始识别时初始化
+            self.logger.info("正在初始化OCR引擎...")
+            self.notify("正在初始化OCR引擎...")
+            self.ocr_service.start()
+            ocr = self.ocr_service.client(self.window_title)
+            self.logger.info("OCR引擎初始化完成")
+            
+            # 截图对象在整个识别过程中复用
+            capturer = create_capture_backend(self.window_title, self.config["capture"])
+            
+            # 只有真实窗口的点击会让画面变化
+            verify_config = self.config["verify"]
+            if verify_config.get("enabled", True) and not self.dry_run:
+                self.verifier = ClickVerifier.from_config(capturer.probe, verify_config, self.metrics)
+            
+            recorder = None
+            if self.config["record"].get("enabled", False):
+                recorder = SessionRecorder.from_config(self.config["record"], capturer.color, self.window_title)
+        except Exception as e:
+            self.report_error(f"OCR引擎初始化失败: {str(e)}")
+            self.finish()
+            return
+
+        # 截图、识别、点击分别在独立线程中执行
+        self.pipeline = FramePipeline(
+            capture=lambda epoch: self.capture_frame(capturer, epoch),
+            process=lambda frame: self.process_frame(ocr, frame, recorder),
+            interval=self.next_interval,  # 使用动态识别间隔
+            is_running=lambda: self.is_running,
+            on_error=self.report_error,
+            queue_size=self.config["pipeline"].get("queue_size", 1),
+            paced=capturer.paced,
+            max_in_flight=getattr(capturer, "buffer_count", None),
+        )
+        try:
+            self.pipeline.run()
+        finally:
+            ocr.close()
+            capturer.close()
+            if self.scheduler:
+                self.scheduler.save()
+                self.logger.info(f"识别调度统计: {self.scheduler.stats()}")
+            if self.verifier:
+                self.logger.info(f"点击确认统计: {self.verifier.stats()}")
+            if recorder:
+                recorder.close()
+
+        self.finish()
+
+    def finish(self):
+        self.is_running = False
+        if self.on_finished:
+            self.on_finished()
+
+    def stop(self):
+        self.logger.info("停止OCR识别")
+        self.is_running = False
+        if self.pipeline:
+            self.pipeline.stop()
+
+    def status(self):
+        """会话状态，供控制接口和界面查询"""
+        status = {
+            "window": self.window_title,
+            "running": self.is_running,
+            "task": self.current_task,
+            "started_at": self.started_at,
+            "clicks": self.input.clicks,
+            "messages": list(self.messages),
+        }
+        if self.scheduler:
+            status["rounds"] = self.scheduler.rounds
+            status["rounds_per_hour"] = round(self.scheduler.rounds_per_hour(), 1)
+        return status
@@ -0,0 +1,221 @@
+import argparse
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from bench import process_rss_mb
+from config import CONFIG_FILE, load_config
+from logging_setup import setup_logger
+from runner import SessionManager
+
+
+def handle_counts():
+    """当前进程的句柄数：Windows 上为 GDI 对象、USER 对象和内核句柄数，其他系统为打开的文件描述符数"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        handles = wintypes.DWORD()
+        ctypes.windll.kernel32.GetProcessHandleCount(process, ctypes.byref(handles))
+        return {
+            "gdi": ctypes.windll.user32.GetGuiResources(process, 0),
+            "user": ctypes.windll.user32.GetGuiResources(process, 1),
+            "handles": handles.value,
+        }
+    try:
+        return {"handles": len(os.listdir("/proc/self/fd"))}
+    except OSError:
+        return {}
+
+
+def slope_per_hour(points):
+    """最小二乘拟合的斜率（每小时的变化量），points 为 [(秒, 值), ...]"""
+    points = [(t, v) for t, v in points if v is not None]
+    if len(points) < 3:
+        return 0.0
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if var_t == 0:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / var_t * 3600
+
+
+class SoakMonitor:
+    """长时间运行时按间隔采样内存、句柄数和识别耗时，结束时给出增长趋势
+
+    前 warmup 秒是模型加载和缓存填充，不参与趋势判断，tracemalloc 的基准快照也在预热结束时记录。
+    """
+
+    # 趋势判断的阈值：每小时增长超过该值时报告
+    DEFAULT_LIMITS = {
+        "rss_mb": 20.0,        # 进程内存 MB/小时
+        "traced_mb": 5.0,      # Python 对象分配 MB/小时
+        "gdi": 5.0,            # GDI 对象数/小时
+        "user": 5.0,
+        "handles": 20.0,
+        "threads": 1.0,
+        "ocr_mean_ms": 0.1,    # 识别耗时按相对均值的比例：每小时变慢 10%
+    }
+
+    def __init__(self, metrics, interval=60.0, warmup=300.0, limits=None, top=15):
+        self.metrics = metrics
+        self.interval = interval
+        self.warmup = warmup
+        self.limits = dict(self.DEFAULT_LIMITS, **(limits or {}))
+        self.top = top
+        self.logger = logging.getLogger()
+        self.samples = []
+        self.started = None
+        self._baseline = None
+        self._last_ocr = (0, 0.0)
+
+    def start(self):
+        tracemalloc.start(10)
+        self.started = time.monotonic()
+
+    def sample(self):
+        elapsed = time.monotonic() - self.started
+        snapshot = self.metrics.snapshot()
+        ocr = snapshot["stages"].get("ocr", {})
+        count, total = ocr.get("count", 0), ocr.get("sum_ms", 0.0)
+        # 两次采样之间的平均识别耗时，不受滑动窗口长度影响
+        last_count, last_total = self._last_ocr
+        mean = (total - last_total) / (count - last_count) if count > last_count else None
+        self._last_ocr = (count, total)
+        traced, _ = tracemalloc.get_traced_memory()
+        sample = {
+            "t": round(elapsed, 1),
+            "rss_mb": round(process_rss_mb() or 0.0, 1),
+            "traced_mb": round(traced / 1048576, 2),
+            "threads": threading.active_count(),
+            "frames": snapshot["counters"].get("frames", 0),
+            "ocr_mean_ms": round(mean, 2) if mean is not None else None,
+            "ocr_p95_ms": ocr.get("p95_ms"),
+            "capture_p95_ms": snapshot["stages"].get("capture", {}).get("p95_ms"),
+        }
+        sample.update(handle_counts())
+        self.samples.append(sample)
+        if self._baseline is None and elapsed >= self.warmup:
+            self._baseline = tracemalloc.take_snapshot()
+        self.logger.info(f"长时间运行采样: {sample}")
+        return sample
+
+    def allocation_growth(self):
+        """预热结束以来增长最多的分配位置"""
+        if self._baseline is None:
+            return []
+        current = tracemalloc.take_snapshot()
+        stats = current.compare_to(self._baseline, "lineno")
+        return [{"location": str(stat.traceback), "size_kb": round(stat.size_diff / 1024, 1),
+                 "count": stat.count_diff} for stat in stats[:self.top] if stat.size_diff > 0]
+
+    def trends(self):
+        """预热之后各指标的增长趋势，超过阈值的标记为 flagged"""
+        samples = [s for s in self.samples if s["t"] >= self.warmup] or self.samples
+        trends = {}
+        for name, limit in self.limits.items():
+            points = [(s["t"], s.get(name)) for s in samples if s.get(name) is not None]
+            if not points:
+                continue
+            slope = slope_per_hour(points)
+            values = [v for _, v in points]
+            threshold = limit
+            if name == "ocr_mean_ms":
+                threshold = limit * sum(values) / len(values)
+            trends[name] = {
+                "first": values[0],
+                "last": values[-1],
+                "max": max(values),
+                "slope_per_hour": round(slope, 3),
+                "flagged": slope > threshold and values[-1] > values[0],
+            }
+        return trends
+
+    def report(self):
+        trends = self.trends()
+        return {
+            "duration_hours": round(self.samples[-1]["t"] / 3600, 3) if self.samples else 0.0,
+            "warmup_seconds": self.warmup,
+            "flagged": [name for name, trend in trends.items() if trend["flagged"]],
+            "trends": trends,
+            "allocation_growth": self.allocation_growth(),
+            "samples": self.samples,
+        }
+
+
+def soak_config(config, args):
+    """长时间运行使用的配置：重放或合成画面，开启统计（不导出文件）"""
+    config = copy.deepcopy(config)
+    capture = config["capture"]
+    capture["backend"] = args.backend
+    if args.path:
+        capture["path"] = args.path
+    capture["loop"] = True
+    capture["realtime"] = args.realtime
+    config["metrics"]["enabled"] = True
+    config["control"]["enabled"] = False
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长时间运行完整的识别循环，记录内存、句柄和识别耗时的增长趋势")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--hours", type=float, default=8.0)
+    parser.add_argument("--backend", default="synthetic", choices=["synthetic", "replay", "file"])
+    parser.add_argument("--path", default="", help="录制目录（replay）或图片目录（file）")
+    parser.add_argument("--realtime", action="store_true", help="回放时按录制时的节奏")
+    parser.add_argument("--windows", type=int, default=1, help="同时运行的会话数")
+    parser.add_argument("--interval", type=float, default=60.0, help="采样间隔（秒）")
+    parser.add_argument("--warmup", type=float, default=300.0, help="不参与趋势判断的预热时间（秒）")
+    parser.add_argument("--output", default="soak_report.json")
+    args = parser.parse_args()
+
+    config = soak_config(load_config(args.config), args)
+    logger = setup_logger(config["logging"].get("queue_size", 10000))
+    manager = SessionManager(config)
+    monitor = SoakMonitor(manager.metrics, args.interval, args.warmup)
+    monitor.start()
+    deadline = time.monotonic() + args.hours * 3600
+    titles = [f"soak-{i + 1}" for i in range(args.windows)]
+    logger.info(f"开始长时间运行测试: {args.hours} 小时，{args.windows} 个会话，{args.backend} 画面")
+    try:
+        manager.preload()
+        manager.start(titles)
+        monitor.sample()
+        while time.monotonic() < deadline:
+            time.sleep(min(args.interval, max(0.0, deadline - time.monotonic())))
+            monitor.sample()
+            # 回放读完或会话出错退出时重新启动，保持负载
+            missing = [title for title in titles if title not in manager.sessions]
+            if missing:
+                logger.warning(f"会话已结束，重新启动: {missing}")
+                manager.start(missing)
+    except KeyboardInterrupt:
+        logger.info("收到中断信号，提前结束")
+    finally:
+        manager.shutdown()
+
+    report = monitor.report()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for name, trend in report["trends"].items():
+        mark = "增长" if trend["flagged"] else "正常"
+        print(f"{name:<14} {trend['first']} -> {trend['last']}  每小时 {trend['slope_per_hour']:+.3f}  {mark}")
+    for item in report["allocation_growth"][:5]:
+        print(f"  +{item['size_kb']} KB  {item['location']}")
+    if report["flagged"]:
+        print(f"发现持续增长: {', '.join(report['flagged'])}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
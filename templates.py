@@ -0,0 +1,165 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from roi import box_bounds
+
+
+def half_gray(region):
+    """隔行隔列采样并转为灰度，模板匹配在半分辨率上进行"""
+    small = region[::2, ::2]
+    if small.ndim == 3:
+        return small[..., :3].mean(axis=2, dtype=np.float32)
+    return small.astype(np.float32)
+
+
+def match_template(region, template):
+    """向量化的归一化互相关(NCC)，返回 (最高分, 左上角偏移)
+
+    template 已减去均值，窗口的均值项与它的乘积为零，分子只需一次 einsum；
+    窗口的方差用积分图计算。
+    """
+    th, tw = template.shape
+    if region.shape[0] < th or region.shape[1] < tw:
+        return -1.0, (0, 0)
+    windows = sliding_window_view(region, (th, tw))
+    numerator = np.einsum('ijkl,kl->ij', windows, template)
+
+    n = th * tw
+    integral = np.pad(region, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    integral_sq = np.pad(region * region, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+
+    def window_sum(table):
+        return table[th:, tw:] - table[:-th, tw:] - table[th:, :-tw] + table[:-th, :-tw]
+
+    sums = window_sum(integral)
+    variance = np.maximum(window_sum(integral_sq) - sums * sums / n, 1e-6)
+    scores = numerator / np.sqrt(variance * float((template * template).sum()))
+    index = int(np.argmax(scores))
+    y, x = divmod(index, scores.shape[1])
+    return float(scores[y, x]), (y, x)
+
+
+class TemplateMatcher:
+    """已知按钮的模板匹配快速通道
+
+    OCR 定位到目标文本后保存它的像素块作为模板，键为 (任务状态, 图像高, 图像宽)，
+    窗口尺寸或DPI变化后自动使用新的一组模板。之后的帧先在模板原位置附近做NCC匹配，
+    该键的所有模板都匹配时才直接返回与 ocr.ocr 相同结构的结果，只匹配到一部分时做完整OCR。
+    NCC 对亮度和对比度不敏感，变灰（禁用）的按钮得分仍然很高，所以还要求匹配位置的平均灰度
+    与模板相差不超过 max_intensity_shift，灰度标准差不低于模板的 min_contrast 倍。
+    """
+
+    def __init__(self, threshold=0.92, search_margin=32, verify_every=10, max_templates=8,
+                 max_intensity_shift=24.0, min_contrast=0.7):
+        self.threshold = threshold
+        self.max_intensity_shift = max_intensity_shift
+        self.min_contrast = min_contrast
+        self.search_margin = search_margin
+        self.verify_every = max(1, verify_every)  # 连续命中多少次后做一次完整OCR校验
+        self.max_templates = max_templates        # 每个键最多保存的模板数
+        self.hits = 0    # 直接使用模板结果、跳过OCR的帧数
+        self.misses = 0
+        self._streak = 0
+        self._templates = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            threshold=config.get("threshold", 0.92),
+            search_margin=config.get("search_margin", 32),
+            verify_every=config.get("verify_every", 10),
+            max_templates=config.get("max_templates", 8),
+            max_intensity_shift=config.get("max_intensity_shift", 24.0),
+            min_contrast=config.get("min_contrast", 0.7),
+        )
+
+    def learn(self, key, lines, img_array):
+        """用OCR找到的目标文本行更新模板，同一位置的旧模板被替换"""
+        templates = self._templates.setdefault(key, [])
+        for box, (text, confidence) in lines:
+            x0, y0, x1, y1 = (int(round(v)) for v in box_bounds(box))
+            x0, y0 = max(0, x0) & ~1, max(0, y0) & ~1  # 对齐到偶数，和半分辨率采样一致
+            patch = half_gray(img_array[y0:y1, x0:x1])
+            if patch.shape[0] < 4 or patch.shape[1] < 4:
+                continue
+            mean, std = float(patch.mean()), float(patch.std())
+            patch = patch - mean
+            if float((patch * patch).sum()) < 1e-3:
+                continue  # 纯色区域无法匹配
+            entry = {"text": text, "confidence": confidence, "box": np.asarray(box, dtype=np.float32),
+                     "origin": (x0, y0), "patch": patch, "mean": mean, "std": std}
+            for i, old in enumerate(templates):
+                if old["text"] == text and abs(old["origin"][0] - x0) <= self.search_margin \
+                        and abs(old["origin"][1] - y0) <= self.search_margin:
+                    templates[i] = entry
+                    break
+            else:
+                templates.append(entry)
+                del templates[:-self.max_templates]
+
+    def match(self, key, img_array):
+        """在模板原位置附近搜索，返回 ocr.ocr 结构的结果，有任何一个模板不匹配时返回None"""
+        templates = self._templates.get(key)
+        if not templates:
+            return None
+
+        height, width = img_array.shape[:2]
+        lines = []
+        for entry in templates:
+            th, tw = entry["patch"].shape
+            ox, oy = entry["origin"]
+            rx0 = max(0, ox - self.search_margin) & ~1
+            ry0 = max(0, oy - self.search_margin) & ~1
+            rx1 = min(width, ox + tw * 2 + self.search_margin)
+            ry1 = min(height, oy + th * 2 + self.search_margin)
+            region = half_gray(img_array[ry0:ry1, rx0:rx1])
+            score, (dy, dx) = match_template(region, entry["patch"])
+            if score < self.threshold:
+                return None
+            window = region[dy:dy + th, dx:dx + tw]
+            if abs(float(window.mean()) - entry["mean"]) > self.max_intensity_shift \
+                    or float(window.std()) < entry["std"] * self.min_contrast:
+                return None  # 形状相同但变暗或变灰，例如按钮被禁用
+            shift = np.array([rx0 + dx * 2 - ox, ry0 + dy * 2 - oy], dtype=np.float32)
+            lines.append([(entry["box"] + shift).tolist(), (entry["text"], entry["confidence"])])
+
+        # 与OCR结果一样按从上到下、从左到右排列
+        lines.sort(key=lambda line: (line[0][0][1], line[0][0][0]))
+        return [lines]
+
+    def use_fast_path(self, matched):
+        """决定是否直接使用模板结果；连续命中 verify_every 次后做一次完整OCR校验"""
+        if matched is None:
+            self._streak = 0
+            self.misses += 1
+            return False
+        self._streak += 1
+        if self._streak > self.verify_every:
+            self._streak = 0
+            return False
+        self.hits += 1
+        return True
+
+    def update(self, key, lines, img_array):
+        """完整OCR之后调用：OCR没有在附近找到同样文本的模板作废，再学习OCR找到的目标
+
+        模板集合因此总是与最近一次OCR看到的目标一致，已经不在画面上的目标不会让快速通道一直失效。
+        """
+        templates = self._templates.get(key)
+        if templates:
+            found = [(text, box_bounds(box)) for box, (text, _) in lines]
+
+            def confirmed(entry):
+                x0, y0 = entry["origin"]
+                return any(text == entry["text"] and abs(bx0 - x0) <= self.search_margin
+                           and abs(by0 - y0) <= self.search_margin for text, (bx0, by0, _, _) in found)
+
+            templates[:] = [entry for entry in templates if confirmed(entry)]
+        if lines:
+            self.learn(key, lines, img_array)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._templates.clear()
+        else:
+            self._templates.pop(key, None)
@@ -0,0 +1,87 @@
+import math
+
+import numpy as np
+
+from roi import box_bounds, offset_result
+
+
+def tile_spans(length, tile_size, overlap):
+    """把一条边分成若干段 (起点, 终点)，相邻段重叠不少于 overlap，各段均匀分布"""
+    if length <= tile_size:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / (tile_size - overlap))
+    step = (length - tile_size) / (count - 1)
+    return [(int(round(i * step)), int(round(i * step)) + tile_size) for i in range(count)]
+
+
+def merge_lines(lines, overlap_threshold=0.6):
+    """合并各分块的识别结果并去掉接缝处的重复文本框
+
+    同一行文字在两个分块里会各出现一次，其中一个常被接缝截断，是另一个的一部分，
+    所以用交集占较小框面积的比例判断重复，保留面积更大（更完整）的框，面积相近时保留置信度高的。
+    """
+    def area(bounds):
+        return max(0.0, bounds[2] - bounds[0]) * max(0.0, bounds[3] - bounds[1])
+
+    candidates = sorted(((box_bounds(line[0]), line) for line in lines),
+                        key=lambda item: (area(item[0]), item[1][1][1]), reverse=True)
+    kept = []
+    for bounds, line in candidates:
+        duplicate = False
+        for other, _ in kept:
+            ix = min(bounds[2], other[2]) - max(bounds[0], other[0])
+            iy = min(bounds[3], other[3]) - max(bounds[1], other[1])
+            if ix > 0 and iy > 0 and ix * iy >= overlap_threshold * max(1e-6, min(area(bounds), area(other))):
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append((bounds, line))
+    # 与OCR结果一样按从上到下、从左到右排列
+    kept.sort(key=lambda item: (item[0][1], item[0][0]))
+    return [line for _, line in kept]
+
+
+class Tiler:
+    """大窗口分块识别：把一帧切成互相重叠的分块，作为多个请求同时交给OCR服务的各个工作线程/进程
+
+    overlap 需要大于最长的目标文本宽度，这样被接缝截断的文字在相邻分块中总有一份完整的。
+    只有长边不小于 min_side 的图像才分块。
+    """
+
+    def __init__(self, tile_size=960, overlap=160, min_side=1600, overlap_threshold=0.6):
+        self.tile_size = tile_size
+        self.overlap = min(overlap, tile_size // 2)
+        self.min_side = min_side
+        self.overlap_threshold = overlap_threshold
+        self.frames = 0  # 分块识别的帧数
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            tile_size=config.get("tile_size", 960),
+            overlap=config.get("overlap", 160),
+            min_side=config.get("min_side", 1600),
+            overlap_threshold=config.get("overlap_threshold", 0.6),
+        )
+
+    def applies(self, shape):
+        return max(shape[:2]) >= self.min_side
+
+    def tiles(self, shape):
+        """分块区域列表 [(x0, y0, x1, y1), ...]"""
+        height, width = shape[:2]
+        return [(x0, y0, x1, y1) for y0, y1 in tile_spans(height, self.tile_size, self.overlap)
+                for x0, x1 in tile_spans(width, self.tile_size, self.overlap)]
+
+    def ocr(self, ocr, img_array, **kwargs):
+        """分块并行识别，返回与 ocr.ocr 相同结构的整帧结果"""
+        tiles = self.tiles(img_array.shape)
+        crops = [np.ascontiguousarray(img_array[y0:y1, x0:x1]) for x0, y0, x1, y1 in tiles]
+        lines = []
+        for (x0, y0, _, _), result in zip(tiles, ocr.ocr_many(crops, **kwargs)):
+            result = offset_result(result, x0, y0)
+            if result and result[0]:
+                lines.extend(result[0])
+        self.frames += 1
+        merged = merge_lines(lines, self.overlap_threshold)
+        return [merged or None]
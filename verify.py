@@ -0,0 +1,105 @@
+import logging
+import time
+
+import numpy as np
+
+from roi import box_bounds
+from templates import half_gray
+
+
+def region_diff(before, after):
+    """两块区域半分辨率灰度的平均绝对差，尺寸不同（窗口大小变了）视为完全变化"""
+    if before.shape != after.shape:
+        return float("inf")
+    return float(np.abs(half_gray(before) - half_gray(after)).mean())
+
+
+class ClickVerifier:
+    """点击后确认界面有反应，代替固定的等待时间
+
+    点击前截取目标所在区域，点击后每隔 poll_interval 秒只截这一小块比较像素（不做OCR），
+    差异超过 threshold 立即返回；超时仍没有变化时认为点击没有生效，马上重新点击，最多 retries 次。
+    """
+
+    def __init__(self, probe, timeout=1.5, poll_interval=0.03, threshold=6.0, retries=1, margin=24,
+                 settle=0.1, metrics=None):
+        self.probe = probe                  # probe(x0, y0, x1, y1) -> 区域图像，不支持时返回None
+        self.timeout = timeout              # 等待界面反应的最长时间（秒）
+        self.poll_interval = poll_interval
+        self.threshold = threshold
+        self.retries = retries
+        self.margin = margin                # 目标文本框向外扩展的像素，按钮通常比文字大
+        self.settle = settle                # 检测到变化后再等待动画结束的时间（秒）
+        self.metrics = metrics
+        self.logger = logging.getLogger()
+        self.verified = 0
+        self.retried = 0
+        self.unverified = 0
+
+    @classmethod
+    def from_config(cls, probe, config, metrics=None):
+        return cls(
+            probe,
+            timeout=config.get("timeout", 1.5),
+            poll_interval=config.get("poll_interval", 0.03),
+            threshold=config.get("threshold", 6.0),
+            retries=config.get("retries", 1),
+            margin=config.get("margin", 24),
+            settle=config.get("settle", 0.1),
+            metrics=metrics,
+        )
+
+    def region(self, x, y, box=None):
+        """要监视的区域：目标文本框（没有时为点击位置）向外扩展 margin 像素"""
+        x0, y0, x1, y1 = box_bounds(box) if box is not None else (x, y, x, y)
+        return (int(x0) - self.margin, int(y0) - self.margin, int(x1) + self.margin, int(y1) + self.margin)
+
+    def wait_for_change(self, region, before, timeout):
+        """等待区域像素变化，返回等待的秒数，超时返回None"""
+        start = time.perf_counter()
+        deadline = start + timeout
+        while True:
+            time.sleep(self.poll_interval)
+            after = self.probe(*region)
+            if after is None:
+                return None
+            if region_diff(before, after) > self.threshold:
+                return time.perf_counter() - start
+            if time.perf_counter() >= deadline:
+                return None
+
+    def click(self, do_click, region, timeout=None):
+        """执行 do_click() 并确认界面变化
+
+        返回 True 已确认、False 重试后仍没有变化（或点击失败）；无法截取区域时只点击一次并返回None，
+        由调用方按原来的固定时间等待。
+        """
+        timeout = max(timeout or 0.0, self.timeout)
+        before = self.probe(*region)
+        if before is None or before.size == 0:
+            do_click()
+            return None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                if self.metrics:
+                    self.metrics.inc("click_retries")
+                self.logger.warning(f"点击后 {timeout:.1f} 秒内界面没有变化，重新点击（第 {attempt} 次）")
+            if not do_click():
+                return False
+            elapsed = self.wait_for_change(region, before, timeout)
+            if elapsed is not None:
+                self.verified += 1
+                if self.metrics:
+                    self.metrics.observe("verify", elapsed)
+                self.logger.info(f"点击后 {elapsed * 1000:.0f} ms 界面发生变化")
+                if self.settle > 0:
+                    time.sleep(self.settle)
+                return True
+        self.unverified += 1
+        if self.metrics:
+            self.metrics.inc("click_unverified")
+        return False
+
+    def stats(self):
+        return {"verified": self.verified, "retried": self.retried, "unverified": self.unverified}